@@ -0,0 +1,10 @@
+"""
+基准测试与压测工具，用法见 python -m benchmarks --help。
+
+- seed：按固定随机种子生成 N 个用户 / M 篇文章 / K 个标签 / C 条评论的合成数据；
+- micro：热点函数的微基准（字数统计、分词、Markdown 渲染、标签解析等）；
+- routes：用 Flask 测试客户端或本地 WSGI 服务压测主要路由，统计 p50/p95/p99、吞吐量和 SQL 条数；
+- compare：与保存的基线结果对比，超过阈值的退化会被标出来。
+
+默认使用 benchmarks/results/bench.db，不会碰 instance 下的正式数据库。
+"""
@@ -0,0 +1,133 @@
+"""
+命令行入口：
+
+    python -m benchmarks seed --users 20 --articles 2000 --tags 100 --comments 20000
+    python -m benchmarks micro
+    python -m benchmarks routes [--server --concurrency 8] [--requests 500]
+    python -m benchmarks all --save-baseline        # 重建数据 + 微基准 + 路由压测，并存为基线
+    python -m benchmarks all --baseline benchmarks/results/baseline.json
+    python -m benchmarks startup [--runs 5] [--workers 4] [--path ../旧版本的检出]   # 冷启动耗时和 worker 内存
+
+数据库默认是 benchmarks/results/bench.db，可以用 --database 指定其它地址。
+"""
+import argparse
+import os
+import sys
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_DATABASE = os.path.join(RESULTS_DIR, 'bench.db')
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='博客应用的基准测试')
+    parser.add_argument('command', choices=['seed', 'micro', 'routes', 'all', 'startup'])
+    parser.add_argument('--database', help='数据库地址，默认 sqlite:///benchmarks/results/bench.db')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--articles', type=int, default=500)
+    parser.add_argument('--tags', type=int, default=50)
+    parser.add_argument('--comments', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=200, help='每个路由场景的请求数')
+    parser.add_argument('--server', action='store_true', help='起本地 WSGI 服务并发压测，而不是用测试客户端')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--page-cache', action='store_true', help='保留匿名页面缓存（默认关闭，测的是真实渲染路径）')
+    parser.add_argument('--only', nargs='*', help='只运行这些用例/场景')
+    parser.add_argument('--output', help='结果保存路径（JSON）')
+    parser.add_argument('--baseline', help=f'与该基线对比，默认 {DEFAULT_BASELINE}（存在时）')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=0.10, help='p95 变慢超过该比例视为退化')
+    parser.add_argument('--runs', type=int, default=5, help='startup：每种启动方式测量的次数')
+    parser.add_argument('--workers', type=int, default=4, help='startup：preload 模式 fork 的 worker 数')
+    parser.add_argument('--path', nargs='*', default=[], help='startup：另外要测量并对比的目录')
+    return parser.parse_args(argv)
+
+
+def load_app(args, fresh=False):
+    """按参数配置数据库后创建应用（create_app 从 DATABASE_URL 读取数据库地址）"""
+    if fresh and not args.database and os.path.exists(DEFAULT_DATABASE):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(DEFAULT_DATABASE + suffix):
+                os.remove(DEFAULT_DATABASE + suffix)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    os.environ['DATABASE_URL'] = args.database or f'sqlite:///{DEFAULT_DATABASE}'
+
+    from app import create_app
+    from migrations import upgrade_database
+    from page_cache import page_cache
+
+    # 压测时不刷慢请求日志；关掉限流和去重，否则反复提交相同评论测到的只是被拒绝的路径
+    app = create_app({'SLOW_REQUEST_THRESHOLD': float('inf'), 'RATE_LIMIT_ENABLED': False})
+    page_cache.enabled = args.page_cache
+    with app.app_context():
+        upgrade_database()
+    return app
+
+
+def command_seed(app, args):
+    from benchmarks.seed import seed
+    from search_index import rebuild_search_index
+    from term_counts import backfill_term_counts
+
+    with app.app_context():
+        counts = seed(args.users, args.articles, args.tags, args.comments, random_seed=args.seed)
+        counts['search_index'] = rebuild_search_index()
+        backfill_term_counts()
+    print('已生成：' + '，'.join(f'{k} {v}' for k, v in counts.items()))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from benchmarks.report import compare, format_table, load_results, save_results, summarize
+
+    if args.command == 'startup':
+        # 每次测量都在新的解释器里进行，不需要在本进程里创建应用
+        from benchmarks.startup import format_startup, run_startup
+        tree = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        results = run_startup([tree] + args.path, args.runs, args.workers)
+        print(format_startup(results))
+        if args.output:
+            save_results(args.output, results, command='startup', runs=args.runs, workers=args.workers)
+        return 0
+
+    app = load_app(args, fresh=(args.command == 'all'))
+    if args.command in ('seed', 'all'):
+        command_seed(app, args)
+        if args.command == 'seed':
+            return 0
+
+    results = {}
+    if args.command in ('micro', 'all'):
+        from benchmarks.micro import run_micro
+        for name, samples in run_micro(app, only=args.only).items():
+            results[f'micro.{name}'] = summarize(samples)
+    if args.command in ('routes', 'all'):
+        from benchmarks.routes import run_routes
+        for name, summary in run_routes(app, args.requests, args.server, args.concurrency,
+                                        only=args.only, random_seed=args.seed).items():
+            results[f'route.{name}'] = summary
+
+    print(format_table(results))
+    meta = {'command': args.command, 'server': args.server, 'concurrency': args.concurrency,
+            'requests': args.requests, 'page_cache': args.page_cache}
+    if args.output:
+        save_results(args.output, results, **meta)
+
+    regressed = False
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        baseline, baseline_meta = load_results(baseline_path)
+        report, regressed = compare(results, baseline, args.threshold)
+        print(f'\n与基线 {baseline_path} 对比：')
+        changed = [k for k in ('server', 'concurrency', 'page_cache') if baseline_meta.get(k) != meta[k]]
+        if changed:
+            print(f'注意：运行参数与基线不同（{", ".join(changed)}），结果不可直接比较')
+        print(report)
+    if args.save_baseline:
+        save_results(baseline_path, results, **meta)
+        print(f'\n已保存基线：{baseline_path}')
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
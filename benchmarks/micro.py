@@ -0,0 +1,106 @@
+"""
+热点函数的微基准。
+
+每个用例重复若干轮，每轮调用 number 次（默认按单次耗时自动定，每轮约 50ms），取每次调用的耗时分布；
+需要数据库的用例（标签解析）在应用上下文里执行，每轮结束回滚，不留下数据。
+"""
+import random
+import time
+
+from benchmarks.seed import make_markdown
+
+# 用例名 -> (准备函数, 是否需要数据库)；准备函数返回无参的被测函数，条件不满足时返回 None
+CASES = {}
+
+
+def case(name, needs_db=False):
+    def decorator(func):
+        CASES[name] = (func, needs_db)
+        return func
+    return decorator
+
+
+@case('count_words')
+def _count_words():
+    from models import count_words
+    content = make_markdown(random.Random(1), sections=8)
+    return lambda: count_words(content)
+
+
+@case('search.tokenize')
+def _tokenize():
+    from search_index import tokenize
+    content = make_markdown(random.Random(2), sections=8)
+    return lambda: tokenize(content)
+
+
+@case('markdown.render')
+def _render():
+    from markdown_render import render_markdown, markdown_available
+    if not markdown_available():
+        return None
+    content = make_markdown(random.Random(3), sections=8)
+    return lambda: render_markdown(content)
+
+
+@case('revisions.diff_splice')
+def _diff_splice():
+    from revisions import diff_splice
+    old = make_markdown(random.Random(4), sections=20)
+    new = old[:len(old) // 2] + '新增一句话。' + old[len(old) // 2:]
+    return lambda: diff_splice(old, new)
+
+
+@case('terms.parse_tag_names')
+def _parse_tags():
+    from terms import parse_tag_names
+    raw = '，'.join(f'标签{i}' for i in range(20)) + ',Python, Flask ,,数据库'
+    return lambda: parse_tag_names(raw)
+
+
+@case('terms.resolve_tags', needs_db=True)
+def _resolve_tags():
+    from models import db, User
+    from terms import resolve_tags
+    user_id = db.session.query(db.func.min(User.id)).scalar()
+    names = [f'标签{i}' for i in range(10)] + [f'bench-new-{i}' for i in range(5)]
+
+    def run():
+        resolve_tags(user_id, names)
+        db.session.rollback()
+    return run if user_id else None
+
+
+def run_case(func, number=None, repeat=7, round_time=0.05):
+    """返回每次调用的耗时列表（每轮的平均值）；number 为空时按每轮约 round_time 秒自动确定"""
+    start = time.perf_counter()
+    func()  # 预热，顺便估算单次耗时
+    if number is None:
+        number = max(1, int(round_time / max(time.perf_counter() - start, 1e-7)))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+
+def run_micro(app=None, number=None, repeat=7, only=None):
+    """运行微基准，返回 {用例名: 每次调用耗时列表}；没有 app 时跳过需要数据库的用例"""
+    results = {}
+    for name, (setup, needs_db) in CASES.items():
+        if only and name not in only:
+            continue
+        if needs_db:
+            if app is None:
+                continue
+            with app.app_context():
+                func = setup()
+                if func is not None:
+                    results[name] = run_case(func, number, repeat)
+            continue
+        func = setup()
+        if func is not None:
+            results[name] = run_case(func, number, repeat)
+    return results
@@ -0,0 +1,85 @@
+"""
+结果统计、保存和基线对比。
+
+结果文件是 JSON：{'meta': {...}, 'results': {名称: {'p50': 秒, 'p95': ..., 'p99': ..., 'rps': ..., 'queries': ...}}}。
+对比时以 p95 为准，比基线慢超过阈值（默认 10%）的记为退化；平均每个请求的 SQL 多出半条以上也算退化。
+"""
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+
+
+def percentile(sorted_values, pct):
+    """线性插值的百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(latencies, elapsed=None, queries=None):
+    """latencies 为每次调用的耗时（秒）；elapsed 为总耗时，用于计算吞吐量"""
+    values = sorted(latencies)
+    total = elapsed if elapsed is not None else sum(values)
+    result = {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'rps': len(values) / total if total else 0.0,
+    }
+    if queries is not None:
+        result['queries'] = queries
+    return result
+
+
+def format_table(results):
+    lines = [f'{"名称":<28}{"次数":>8}{"p50(ms)":>11}{"p95(ms)":>11}{"p99(ms)":>11}{"req/s":>10}{"SQL":>7}']
+    for name, r in results.items():
+        queries = f'{r["queries"]:.1f}' if 'queries' in r else '-'
+        lines.append(f'{name:<30}{r["count"]:>8}{r["p50"] * 1000:>11.3f}{r["p95"] * 1000:>11.3f}'
+                     f'{r["p99"] * 1000:>11.3f}{r["rps"]:>10.1f}{queries:>7}')
+    return '\n'.join(lines)
+
+
+def save_results(path, results, **meta):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    meta.update({'created_at': datetime.now().isoformat(timespec='seconds'),
+                 'python': sys.version.split()[0], 'platform': platform.platform()})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    """返回 (结果, 运行参数)"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['results'], data.get('meta', {})
+
+
+def compare(current, baseline, threshold=0.10):
+    """返回 (报告文本, 是否有退化)"""
+    lines = [f'{"名称":<28}{"基线p95(ms)":>13}{"本次p95(ms)":>13}{"变化":>9}  说明']
+    regressed = False
+    for name, r in current.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f'{name:<30}{"-":>13}{r["p95"] * 1000:>13.3f}{"-":>9}  新增')
+            continue
+        change = (r['p95'] - base['p95']) / base['p95'] if base['p95'] else 0.0
+        notes = []
+        if change > threshold:
+            notes.append('变慢')
+            regressed = True
+        elif change < -threshold:
+            notes.append('变快')
+        if r.get('queries', 0) > base.get('queries', 0) + 0.5:
+            notes.append(f'SQL {base.get("queries", 0):.1f} -> {r["queries"]:.1f}')
+            regressed = True
+        lines.append(f'{name:<30}{base["p95"] * 1000:>13.3f}{r["p95"] * 1000:>13.3f}{change:>+9.1%}  {" ".join(notes)}')
+    return '\n'.join(lines), regressed
@@ -0,0 +1,138 @@
+"""
+路由级压测。
+
+两种驱动方式：
+- 默认用 Flask 测试客户端在本进程内顺序发请求，没有网络开销，结果最稳定；
+- --server 时在本机起一个多线程 WSGI 服务，用 concurrency 个线程并发请求，更接近真实部署。
+每个场景统计延迟分位数、吞吐量和平均每个请求的 SQL 条数（通过引擎事件计数）。
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.report import summarize
+from benchmarks.seed import BENCH_PASSWORD, search_terms
+
+
+class QueryCounter:
+    """统计全部引擎执行的 SQL 条数"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, 'after_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+    def close(self):
+        event.remove(Engine, 'after_cursor_execute', self._on_execute)
+
+
+def build_scenarios(app, random_seed=42):
+    """
+    根据库里已有的数据生成场景：名称 -> (方法, 地址列表, 表单数据, 登录用户名或 None)。
+    地址列表按固定种子抽样，多次运行访问的是同一批页面。
+    """
+    from models import db, User, Article
+    rng = random.Random(random_seed)
+    with app.app_context():
+        article_ids = [row[0] for row in db.session.query(Article.id).filter_by(is_draft=False)]
+        user_ids = [row[0] for row in db.session.query(Article.user_id).filter_by(is_draft=False).distinct()]
+        username = db.session.query(User.username).filter(User.username.like('bench%')) \
+            .order_by(User.id).limit(1).scalar()
+    if not article_ids:
+        raise RuntimeError('数据库里没有已发布的文章，请先运行 python -m benchmarks seed')
+
+    # 热门文章被访问得更多
+    hot = [article_ids[min(int(rng.paretovariate(1.5)) - 1, len(article_ids) - 1)] for _ in range(50)]
+    return {
+        'index': ('GET', ['/'], None, None),
+        'view_article': ('GET', [f'/article/{i}' for i in hot], None, None),
+        'search': ('GET', [f'/search?q={q}' for q in search_terms(random_seed)], None, None),
+        'user_archive': ('GET', [f'/user/{rng.choice(user_ids)}/archive' for _ in range(20)], None, None),
+        'post_comment': ('POST', [f'/article/{i}/comment' for i in hot[:10]],
+                         {'content': '压测评论：这篇文章写得很好。'}, username),
+    }
+
+
+def _run_test_client(app, method, urls, data, username, requests_count, counter):
+    client = app.test_client()
+    if username:
+        client.post('/login', data={'username': username, 'password': BENCH_PASSWORD})
+    # 预热：模板编译、渲染缓存等
+    for url in urls[:3]:
+        client.open(url, method=method, data=data)
+
+    latencies = []
+    counter.count = 0
+    started = time.perf_counter()
+    for i in range(requests_count):
+        t = time.perf_counter()
+        response = client.open(urls[i % len(urls)], method=method, data=data)
+        latencies.append(time.perf_counter() - t)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{urls[i % len(urls)]} 返回 {response.status_code}')
+    return latencies, time.perf_counter() - started
+
+
+def _run_server(base_url, method, urls, data, username, requests_count, concurrency, counter):
+    import requests
+
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            if username:
+                local.session.post(f'{base_url}/login', data={'username': username, 'password': BENCH_PASSWORD})
+        return local.session
+
+    def hit(i):
+        t = time.perf_counter()
+        response = session().request(method, base_url + urls[i % len(urls)], data=data, allow_redirects=False)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{urls[i % len(urls)]} 返回 {response.status_code}')
+        return time.perf_counter() - t
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(hit, range(min(len(urls), 3) * concurrency)))  # 预热并建立会话
+        counter.count = 0
+        started = time.perf_counter()
+        latencies = list(pool.map(hit, range(requests_count)))
+    return latencies, time.perf_counter() - started
+
+
+def run_routes(app, requests_count=200, server=False, concurrency=4, only=None, random_seed=42):
+    """运行全部场景，返回 {场景名: 统计结果}"""
+    scenarios = build_scenarios(app, random_seed)
+    counter = QueryCounter()
+    httpd = None
+    base_url = None
+    if server:
+        from werkzeug.serving import make_server
+        httpd = make_server('127.0.0.1', 0, app, threaded=True)
+        base_url = f'http://127.0.0.1:{httpd.server_port}'
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    results = {}
+    try:
+        for name, (method, urls, data, username) in scenarios.items():
+            if only and name not in only:
+                continue
+            if server:
+                latencies, elapsed = _run_server(base_url, method, urls, data, username,
+                                                 requests_count, concurrency, counter)
+            else:
+                latencies, elapsed = _run_test_client(app, method, urls, data, username, requests_count, counter)
+            results[name] = summarize(latencies, elapsed, queries=counter.count / requests_count)
+    finally:
+        counter.close()
+        if httpd is not None:
+            httpd.shutdown()
+    return results
@@ -0,0 +1,153 @@
+"""
+合成数据生成器。
+
+同样的参数和随机种子总是生成同样的数据，便于前后两次基准结果对比。
+文章正文模仿真实的技术博客：中英混排段落、多级标题、列表、代码块、图片和链接。
+用批量 INSERT 写入，几十万行也只需要几秒。
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from models import (db, User, Article, Category, Tag, Comment, article_tags,
+                    count_words, estimate_read_time, make_excerpt)
+
+BENCH_PASSWORD = 'bench'  # 所有合成用户的密码，路由压测时用来登录
+
+CJK_WORDS = [
+    '数据库', '索引', '缓存', '并发', '事务', '查询优化', '分布式', '一致性', '微服务', '容器',
+    '性能', '延迟', '吞吐量', '内存', '垃圾回收', '线程', '协程', '异步', '消息队列', '负载均衡',
+    '前端', '渲染', '模板', '接口', '鉴权', '日志', '监控', '告警', '部署', '回滚',
+    '算法', '复杂度', '哈希表', '二叉树', '排序', '动态规划', '图论', '字符串', '正则表达式', '编码',
+    '我们', '这个', '问题', '方案', '实际上', '需要', '可以', '因为', '所以', '如果', '但是', '通过', '进行', '发现',
+]
+EN_WORDS = [
+    'Python', 'Flask', 'SQLite', 'Redis', 'Nginx', 'Docker', 'Kubernetes', 'Linux', 'HTTP', 'JSON',
+    'the', 'query', 'index', 'cache', 'latency', 'request', 'response', 'server', 'client', 'thread',
+]
+CODE_SNIPPETS = [
+    ('python', 'def fib(n):\n    a, b = 0, 1\n    for _ in range(n):\n        a, b = b, a + b\n    return a'),
+    ('sql', 'SELECT id, title FROM article\nWHERE is_draft = 0\nORDER BY update_time DESC\nLIMIT 20;'),
+    ('bash', 'pip install -r requirements.txt\nflask --app app upgrade-db\npython app.py'),
+    ('javascript', 'fetch("/api/articles")\n  .then(res => res.json())\n  .then(data => console.log(data));'),
+]
+TAG_WORDS = ['Python', 'Flask', '数据库', '前端', '算法', '运维', '随笔', '读书', '性能', '架构', '安全', '测试']
+
+
+def make_sentence(rng):
+    words = [rng.choice(EN_WORDS) if rng.random() < 0.15 else rng.choice(CJK_WORDS)
+             for _ in range(rng.randint(6, 18))]
+    return ''.join(w if not w.isascii() else f' {w} ' for w in words).strip() + rng.choice('。。。！？')
+
+
+def make_paragraph(rng):
+    return ''.join(make_sentence(rng) for _ in range(rng.randint(2, 6)))
+
+
+def make_markdown(rng, sections=None):
+    """生成一篇 Markdown 正文"""
+    parts = []
+    for i in range(sections or rng.randint(2, 6)):
+        parts.append(f'## {i + 1}. {rng.choice(CJK_WORDS)}{rng.choice(CJK_WORDS)}')
+        for _ in range(rng.randint(1, 4)):
+            parts.append(make_paragraph(rng))
+        roll = rng.random()
+        if roll < 0.3:
+            lang, code = rng.choice(CODE_SNIPPETS)
+            parts.append(f'```{lang}\n{code}\n```')
+        elif roll < 0.45:
+            parts.append(f'![{rng.choice(CJK_WORDS)}](/static/images/bench-{rng.randint(1, 20)}.png)')
+        elif roll < 0.65:
+            parts.append('\n'.join(f'- **{rng.choice(CJK_WORDS)}**：{make_sentence(rng)}'
+                                   for _ in range(rng.randint(2, 5))))
+        elif roll < 0.75:
+            parts.append(f'参考 [{rng.choice(EN_WORDS)} 文档](https://example.com/{rng.randint(1, 999)})。')
+    return '\n\n'.join(parts)
+
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+def seed(users=20, articles=500, tags=50, comments=2000, categories_per_user=4, random_seed=42):
+    """生成数据并提交，返回各表写入的行数"""
+    rng = random.Random(random_seed)
+    now = datetime(2026, 1, 1)
+    password = generate_password_hash(BENCH_PASSWORD)
+
+    # 1. 用户
+    first_user = _next_id(User)
+    user_ids = list(range(first_user, first_user + users))
+    db.session.execute(insert(User), [
+        {'id': uid, 'username': f'bench{uid}', 'password': password, 'nickname': f'压测用户{uid}',
+         'bio': make_sentence(rng)} for uid in user_ids])
+
+    # 2. 分类和标签（都属于某个用户，名字在用户内唯一）
+    first_category = _next_id(Category)
+    category_rows, categories_by_user = [], {}
+    for i, uid in enumerate(user_ids):
+        for j in range(categories_per_user):
+            cid = first_category + i * categories_per_user + j
+            category_rows.append({'id': cid, 'name': f'分类{j + 1}', 'user_id': uid})
+            categories_by_user.setdefault(uid, []).append(cid)
+    db.session.execute(insert(Category), category_rows)
+
+    first_tag = _next_id(Tag)
+    tag_rows, tags_by_user = [], {}
+    for i in range(tags):
+        uid = user_ids[i % users]
+        tag_rows.append({'id': first_tag + i, 'name': f'{TAG_WORDS[i % len(TAG_WORDS)]}{i}', 'user_id': uid})
+        tags_by_user.setdefault(uid, []).append(first_tag + i)
+    if tag_rows:
+        db.session.execute(insert(Tag), tag_rows)
+
+    # 3. 文章，时间分布在过去一年里，约 10% 是草稿
+    first_article = _next_id(Article)
+    article_rows, link_rows, published = [], [], []
+    for i in range(articles):
+        aid = first_article + i
+        uid = rng.choice(user_ids)
+        content = make_markdown(rng)
+        word_count = count_words(content)
+        is_draft = rng.random() < 0.1
+        article_rows.append({
+            'id': aid, 'title': f'{rng.choice(CJK_WORDS)}{rng.choice(CJK_WORDS)}实践 #{aid}',
+            'summary': make_sentence(rng), 'content': content, 'user_id': uid,
+            'category_id': rng.choice(categories_by_user[uid]), 'is_draft': is_draft,
+            'update_time': now - timedelta(minutes=rng.randint(0, 525600)),
+            'word_count': word_count, 'read_time': estimate_read_time(word_count), 'excerpt': make_excerpt(content),
+            'comment_count': 0, 'version': 0,
+        })
+        user_tags = tags_by_user.get(uid, [])
+        for tag_id in rng.sample(user_tags, min(len(user_tags), rng.randint(1, 4))):
+            link_rows.append({'article_id': aid, 'tag_id': tag_id})
+        if not is_draft:
+            published.append(article_rows[-1])
+
+    # 4. 评论：热门文章评论更多（按幂律挑选文章）；先生成评论，文章的 comment_count 随之确定
+    comment_rows = []
+    for _ in range(comments if published else 0):
+        article = published[min(int(rng.paretovariate(1.2)) - 1, len(published) - 1)]
+        article['comment_count'] += 1
+        comment_rows.append({
+            'content': make_sentence(rng), 'user_id': rng.choice(user_ids), 'article_id': article['id'],
+            'timestamp': article['update_time'] + timedelta(minutes=rng.randint(1, 43200)),
+        })
+
+    db.session.execute(insert(Article), article_rows)
+    if link_rows:
+        db.session.execute(article_tags.insert(), link_rows)
+    if comment_rows:
+        db.session.execute(insert(Comment), comment_rows)
+
+    db.session.commit()
+    return {'users': users, 'categories': len(category_rows), 'tags': len(tag_rows),
+            'articles': len(article_rows), 'article_tags': len(link_rows), 'comments': len(comment_rows)}
+
+
+def search_terms(random_seed=42, count=20):
+    """压测搜索用的关键词，取自生成正文用的词表"""
+    rng = random.Random(random_seed)
+    return [rng.choice(CJK_WORDS[:40] + EN_WORDS[:10]) for _ in range(count)]
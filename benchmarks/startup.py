@@ -0,0 +1,173 @@
+"""
+启动基准：冷启动耗时和每个 worker 的内存。
+
+每次测量都起一个全新的解释器（和 gunicorn 起 worker 一样没有任何缓存），测两种部署方式：
+- 冷启动：导入应用并创建、处理第一个请求（GET /login，不查数据库）的耗时，之后的 RSS 和已加载模块数；
+- preload：主进程里建好应用（有 wsgi.py 时导入它，和 gunicorn --preload wsgi:app 一样），再 fork 出
+  workers 个子进程各处理一个请求，统计 fork 之后到第一个响应的耗时，以及每个 worker 的私有内存
+  （USS，Private_Clean + Private_Dirty）和按共享进程数分摊后的内存（PSS），数据来自 /proc/self/smaps_rollup。
+--path 可以同时测别的目录（比如旧版本的检出），结果并排列出。导入时就建应用的旧版本没有 create_app，
+自动改用模块里的 app。每项取 runs 次的中位数；测量前先各跑一次丢弃，保证各目录的 .pyc 都已生成。
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import unicodedata
+
+# 在子进程里执行：argv[1] 为 cold / preload，argv[2] 为 preload 模式的 worker 数
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+mode, workers = sys.argv[1], int(sys.argv[2])
+
+
+def load():
+    if mode == 'preload':
+        try:
+            from wsgi import app
+            return app
+        except ImportError:
+            pass
+    import app as module
+    return module.create_app() if hasattr(module, 'create_app') else module.app
+
+
+def memory():
+    """单位 KB；不是 Linux 时为空"""
+    result = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    result[name] = int(value.split()[0])
+    except OSError:
+        return result
+    result['Uss'] = result.pop('Private_Clean', 0) + result.pop('Private_Dirty', 0)
+    return result
+
+
+app = load()
+loaded = time.perf_counter()
+if mode == 'cold':
+    status = app.test_client().get('/login').status_code
+    print(json.dumps({'load': loaded - start, 'first_request': time.perf_counter() - loaded, 'status': status,
+                      'modules': len(sys.modules), **memory()}))
+    sys.exit(0)
+
+reports_r, reports_w = os.pipe()
+release_r, release_w = os.pipe()
+pids = []
+for _ in range(workers):
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(reports_r)
+        os.close(release_w)
+        status = app.test_client().get('/login').status_code
+        report = {'first_response': time.perf_counter() - forked, 'status': status, **memory()}
+        os.write(reports_w, (json.dumps(report) + '\n').encode())
+        os.read(release_r, 1)  # 等所有 worker 都量完再退出，PSS 才是按实际的共享进程数分摊的
+        os._exit(0)
+    pids.append(pid)
+os.close(reports_w)
+os.close(release_r)
+with os.fdopen(reports_r) as f:
+    reports = [json.loads(f.readline()) for _ in pids]
+master = memory()
+os.close(release_w)
+for pid in pids:
+    os.waitpid(pid, 0)
+print(json.dumps({'load': loaded - start, 'master': master, 'workers': reports}))
+'''
+
+
+def run_child(path, mode, workers, env):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, mode, str(workers)], cwd=path, env=env,
+                         capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f'{path} 启动失败：\n{out.stderr}')
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['wall'] = time.perf_counter() - start
+    return result
+
+
+def summarize_startup(cold, preload):
+    """cold / preload 为各次测量的原始结果，返回 {指标: 中位数}，耗时单位秒，内存单位 MB"""
+    def median(values):
+        values = [v for v in values if v is not None]
+        return statistics.median(values) if values else None
+
+    def mb(kb):
+        return kb / 1024 if kb is not None else None
+
+    return {
+        'cold.wall': median(r['wall'] for r in cold),
+        'cold.load': median(r['load'] for r in cold),
+        'cold.first_request': median(r['first_request'] for r in cold),
+        'cold.rss': mb(median(r.get('Rss') for r in cold)),
+        'cold.modules': median(r['modules'] for r in cold),
+        'preload.load': median(r['load'] for r in preload),
+        'preload.first_response': median(w['first_response'] for r in preload for w in r['workers']),
+        'preload.worker_uss': mb(median(w.get('Uss') for r in preload for w in r['workers'])),
+        'preload.worker_pss': mb(median(w.get('Pss') for r in preload for w in r['workers'])),
+        'preload.total_pss': mb(median(
+            r['master'].get('Pss', 0) + sum(w.get('Pss', 0) for w in r['workers']) for r in preload)),
+    }
+
+
+LABELS = [
+    ('cold.wall', '冷启动：进程总耗时(ms)', 1000),
+    ('cold.load', '冷启动：导入并创建应用(ms)', 1000),
+    ('cold.first_request', '冷启动：第一个请求(ms)', 1000),
+    ('cold.rss', '冷启动：RSS(MB)', 1),
+    ('cold.modules', '冷启动：已加载模块数', 1),
+    ('preload.load', 'preload：主进程建应用(ms)', 1000),
+    ('preload.first_response', 'preload：fork 后第一个响应(ms)', 1000),
+    ('preload.worker_uss', 'preload：每个 worker 私有内存 USS(MB)', 1),
+    ('preload.worker_pss', 'preload：每个 worker PSS(MB)', 1),
+    ('preload.total_pss', 'preload：主进程 + 全部 worker PSS(MB)', 1),
+]
+
+
+def _pad(text, width):
+    """按显示宽度左对齐，中文字符占两格"""
+    shown = sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+    return text + ' ' * max(width - shown, 0)
+
+
+def format_startup(results):
+    """results: {目录: measure() 的结果}，每个目录一列"""
+    paths = list(results)
+    lines = [_pad('指标', 40) + ''.join(f'{os.path.basename(p.rstrip(os.sep)) or p:>16}' for p in paths)]
+    for key, label, scale in LABELS:
+        cells = []
+        for path in paths:
+            value = results[path].get(key)
+            cells.append(f'{"-":>16}' if value is None else f'{value * scale:>16.1f}')
+        lines.append(_pad(label, 40) + ''.join(cells))
+    return '\n'.join(lines)
+
+
+def run_startup(paths, runs=5, workers=4):
+    """
+    返回 {目录: summarize_startup() 的结果}。各目录轮流测量而不是测完一个再测下一个，
+    机器负载的起伏平均分摊到每个目录上，对比才公平。
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    samples = {path: {'cold': [], 'preload': []} for path in paths}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(tmp, "startup.db")}',
+                   JOBS_RUN_IN_PROCESS='0', SECRET_KEY='startup-benchmark')
+        for path in paths:
+            run_child(path, 'cold', workers, dict(env, PYTHONPATH=path))  # 生成 .pyc，不计入结果
+        for _ in range(runs):
+            for mode in ('cold', 'preload'):
+                for path in paths:
+                    samples[path][mode].append(run_child(path, mode, workers, dict(env, PYTHONPATH=path)))
+    return {path: summarize_startup(s['cold'], s['preload']) for path, s in samples.items()}
@@ -0,0 +1,383 @@
+"""
+博客的批量导入导出：Markdown + YAML front matter 的 zip / tar.gz 归档。
+
+归档结构：
+    blog.yaml                      作者资料、全部分类和标签（没有文章的也保留）
+    uploads/<key>                  文章引用的上传文件，key 就是内容哈希，导入后地址不变
+    articles/<id>-<标题>.md        front matter（标题、摘要、分类、标签、时间、封面、评论）+ 正文
+两个方向都是流式的：
+- 导出是生成器，按批查询文章（每批一次查标签、一次查评论），每写完一批就把压缩好的字节交出去，
+  可以直接作为 HTTP 响应体，也可以写进文件；
+- 导入按归档里的顺序逐个读取成员，每攒够 IMPORT_BATCH 篇就批量插入、统一解析分类和标签、
+  写全文索引并提交，然后清空会话。
+内存占用只取决于一批文章和单个文件的大小，与归档总大小无关。
+没有 front matter 的 .md 也能导入（标题取文件名），Hexo / Jekyll 的 title、date、tags、
+categories 字段可以直接识别。
+上传文件和网页上传一样先检查、清理再存储；内容变了（比如来自旧版本、带着 EXIF 的原图）就换成新地址，
+文章里的引用跟着替换。评论一律记在导入者名下，原作者名字作为纯文本写在内容前面，
+不会按用户名对应到本站的其他用户。
+"""
+import io
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from datetime import datetime
+
+from sqlalchemy.orm import selectinload, undefer
+from werkzeug.datastructures import FileStorage
+
+from image_pipeline import image_pipeline, validate_image, clean_upload, InvalidImage
+from models import db, User, Article, Category, Tag, Comment, BlobRef
+from search_index import index_article
+from lazy_imports import optional_import
+from storage import upload_store, CHUNK_SIZE
+from terms import parse_tag_names, resolve_terms
+
+EXPORT_BATCH = 200  # 导出时每次查询的文章数
+IMPORT_BATCH = 200  # 导入时每批插入、提交的文章数
+MAX_POST_SIZE = 10 * 1024 * 1024  # 单篇 .md 的大小上限
+
+FRONT_MATTER_RE = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)(.*)\Z', re.DOTALL)
+UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\s.]+')
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _require_yaml():
+    """PyYAML 是可选依赖，第一次导入导出时才加载"""
+    yaml = optional_import('yaml')
+    if yaml is None:
+        raise ArchiveError('导入导出需要安装 PyYAML')
+    return yaml
+
+
+def dump_yaml(data):
+    yaml = _require_yaml()
+    # 有 libyaml 时用 C 实现，解析/生成 front matter 快一个数量级
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    return yaml.dump(data, Dumper=dumper, allow_unicode=True, sort_keys=False, default_flow_style=False)
+
+
+def load_yaml(text):
+    yaml = _require_yaml()
+    return yaml.load(text, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+# --- 归档读写 ---
+class _StreamBuffer:
+    """只写的文件对象：tarfile / zipfile 往里写，导出生成器把写好的字节取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _TarWriter:
+
+    def __init__(self, fileobj):
+        self.tar = tarfile.open(fileobj=fileobj, mode='w|gz')
+
+    def add(self, name, data, mtime=None):
+        self.add_stream(name, io.BytesIO(data), len(data), mtime)
+
+    def add_stream(self, name, fileobj, size, mtime=None):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = (mtime or datetime.now()).timestamp()
+        self.tar.addfile(info, fileobj)
+
+    def close(self):
+        self.tar.close()
+
+
+class _ZipWriter:
+
+    def __init__(self, fileobj):
+        self.zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+
+    def add(self, name, data, mtime=None):
+        info = zipfile.ZipInfo(name, (mtime or datetime.now()).timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self.zip.writestr(info, data)
+
+    def add_stream(self, name, fileobj, size, mtime=None):
+        info = zipfile.ZipInfo(name, (mtime or datetime.now()).timetuple()[:6])
+        info.file_size = size
+        with self.zip.open(info, 'w') as dest:  # 图片本身已压缩，原样存储
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                dest.write(chunk)
+
+    def close(self):
+        self.zip.close()
+
+
+def archive_format(filename):
+    """根据文件名判断归档格式：.zip 之外一律按 tar（可带 gz/bz2/xz 压缩）处理"""
+    return 'zip' if (filename or '').lower().endswith('.zip') else 'tar'
+
+
+def iter_members(fileobj, fmt):
+    """按归档内的顺序逐个产出 (文件名, 可读文件对象)；zip 需要可 seek 的文件"""
+    if fmt == 'zip':
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise ArchiveError('不是有效的 zip 文件')
+        with archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except tarfile.TarError:
+        raise ArchiveError('不是有效的 tar 文件')
+    with archive:
+        for info in archive:
+            if info.isfile():
+                yield info.name, archive.extractfile(info)
+
+
+# --- 单篇文章 <-> Markdown 文件 ---
+def article_filename(article):
+    slug = UNSAFE_FILENAME_RE.sub('-', article.title).strip('-')[:50]
+    return f'articles/{article.id:05d}-{slug or "untitled"}.md'
+
+
+def render_post(article, comments):
+    """文章 -> 带 front matter 的 Markdown 文本；comments 为 [(Comment, 用户名)]"""
+    meta = {
+        'title': article.title,
+        'summary': article.summary,
+        'date': article.update_time,
+        'category': article.category.name if article.category else None,
+        'tags': [t.name for t in article.tags],
+        'draft': bool(article.is_draft),
+        'cover': article.cover_url,
+        'id': article.id,
+        'comments': [{'author': username, 'date': c.timestamp, 'content': c.content} for c, username in comments],
+    }
+    meta = {k: v for k, v in meta.items() if v not in (None, [], '')}
+    return f'---\n{dump_yaml(meta)}---\n\n{article.content}'
+
+
+def parse_post(text, filename):
+    """Markdown 文本 -> 字段字典；没有 front matter 时整篇都是正文"""
+    match = FRONT_MATTER_RE.match(text)
+    meta, content = {}, text
+    if match:
+        yaml = _require_yaml()
+        try:
+            meta = load_yaml(match.group(1)) or {}
+        except yaml.YAMLError as e:
+            raise ArchiveError(f'{filename} 的 front matter 格式错误: {e}')
+        if not isinstance(meta, dict):
+            raise ArchiveError(f'{filename} 的 front matter 格式错误')
+        content = match.group(2).lstrip('\n')
+
+    tags = meta.get('tags') or []
+    category = meta.get('category') or meta.get('categories')
+    if isinstance(category, list):
+        category = category[0] if category else None
+    date = meta.get('date')
+    if not isinstance(date, datetime):
+        try:
+            date = datetime.fromisoformat(str(date)) if date else None
+        except ValueError:
+            date = None
+    title = str(meta.get('title') or os.path.splitext(os.path.basename(filename))[0])
+    return {
+        'title': title[:100],
+        'summary': meta.get('summary') or meta.get('description'),
+        'content': content,
+        'category': str(category).strip()[:50] if category else None,
+        'tags': [n[:50] for n in parse_tag_names(','.join(map(str, tags)) if isinstance(tags, list) else str(tags))],
+        'draft': bool(meta.get('draft', False)),
+        'date': date,
+        'cover': meta.get('cover'),
+        'comments': [c for c in meta.get('comments') or [] if isinstance(c, dict) and c.get('content')],
+    }
+
+
+# --- 导出 ---
+def _article_batches(user_id):
+    """按 id 游标分批取出用户的全部文章（含草稿），每批预加载分类和标签"""
+    last_id = 0
+    while True:
+        batch = Article.query.filter(Article.user_id == user_id, Article.id > last_id) \
+            .options(undefer(Article.content), selectinload(Article.tags), selectinload(Article.category)) \
+            .order_by(Article.id).limit(EXPORT_BATCH).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def export_blog(user_id, fmt='zip'):
+    """生成器：逐块产出归档的字节。需要在应用上下文里迭代（HTTP 响应用 stream_with_context）"""
+    _require_yaml()
+    buffer = _StreamBuffer()
+    writer = _ZipWriter(buffer) if fmt == 'zip' else _TarWriter(buffer)
+
+    user = db.session.get(User, user_id)
+    writer.add('blog.yaml', dump_yaml({
+        'format': 1,
+        'exported_at': datetime.now(),
+        'author': {'username': user.username, 'nickname': user.nickname, 'bio': user.bio},
+        'categories': [c.name for c in Category.query.filter_by(user_id=user_id).order_by(Category.id)],
+        'tags': [t.name for t in Tag.query.filter_by(user_id=user_id).order_by(Tag.id)],
+    }).encode('utf-8'))
+    yield buffer.drain()
+
+    # 上传文件放在文章前面，导入时先存好文件，文章里的地址就能直接登记引用
+    article_ids = db.session.query(Article.id).filter(Article.user_id == user_id)
+    keys = db.session.query(BlobRef.blob_key).filter(
+        BlobRef.owner_type == 'article', BlobRef.owner_id.in_(article_ids)).distinct().order_by(BlobRef.blob_key)
+    for (key,) in keys.all():
+        try:
+            source = upload_store.backend.open(key)
+        except OSError:
+            continue
+        with source:
+            writer.add_stream(f'uploads/{key}', source, os.fstat(source.fileno()).st_size)
+        yield buffer.drain()
+
+    for batch in _article_batches(user_id):
+        comments = {}
+        for comment, username in db.session.query(Comment, User.username).join(User, Comment.user_id == User.id) \
+                .filter(Comment.article_id.in_([a.id for a in batch])).order_by(Comment.timestamp, Comment.id):
+            comments.setdefault(comment.article_id, []).append((comment, username))
+        for article in batch:
+            writer.add(article_filename(article), render_post(article, comments.get(article.id, [])).encode('utf-8'),
+                       article.update_time)
+        for article in batch:
+            db.session.expunge(article)  # 已经写出的文章不再留在会话里
+        for comment, _ in (c for items in comments.values() for c in items):
+            db.session.expunge(comment)
+        yield buffer.drain()
+
+    writer.close()
+    yield buffer.drain()
+
+
+# --- 导入 ---
+def _import_upload(name, member, user_id):
+    """检查、清理并存储归档里的一个上传文件，返回它的 key"""
+    # tar 是流式读取的，不能回退；先落到临时文件里，检查图片时才能重新读
+    spool = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+    shutil.copyfileobj(member, spool, CHUNK_SIZE)
+    spool.seek(0)
+    file = FileStorage(spool, filename=os.path.basename(name))
+    try:
+        ext = validate_image(file)
+    except InvalidImage as e:
+        raise ArchiveError(f'{name}: {e}')
+    with spool:
+        key, _ = upload_store.store(clean_upload(file), ext, user_id)
+    return key
+
+
+def _comment_content(comment, username):
+    """导入的评论记在导入者名下；原作者不是导入者本人时，把名字作为纯文本保留在内容前面"""
+    author, content = str(comment.get('author') or ''), str(comment['content'])
+    return content if author in ('', username) else f'【{author}】{content}'
+
+
+def _import_batch(user_id, posts, result, renamed):
+    categories = {c.name: c for c in resolve_terms(Category, user_id, list({p['category'] for p in posts
+                                                                           if p['category']}))}
+    tags = {t.name: t for t in resolve_terms(Tag, user_id, list({n for p in posts for n in p['tags']}))}
+    username = db.session.get(User, user_id).username
+
+    articles = []
+    for post in posts:
+        comments = post['comments']
+        article = Article(
+            title=post['title'], summary=post['summary'], content=upload_store.replace_keys(post['content'], renamed),
+            user_id=user_id, category_id=categories[post['category']].id if post['category'] else None,
+            is_draft=post['draft'], cover_url=upload_store.replace_keys(post['cover'], renamed),
+            update_time=post['date'] or datetime.now(), comment_count=len(comments), version=0,
+        )
+        article.tags = [tags[n] for n in post['tags']]
+        articles.append((article, comments))
+    db.session.add_all([a for a, _ in articles])
+    db.session.flush()  # 批量 INSERT，拿到新文章的 id
+
+    for article, comments in articles:
+        for c in comments:
+            comment = Comment(content=_comment_content(c, username), user_id=user_id, article_id=article.id)
+            if isinstance(c.get('date'), datetime):
+                comment.timestamp = c['date']
+            db.session.add(comment)
+        result['comments'] += len(comments)
+        index_article(article)
+        keys = upload_store.keys_in(article.content, article.cover_url)
+        if keys:  # 新文章还没有任何引用，没有图片的就不必查了
+            upload_store.set_refs('article', article.id, keys)
+        for key in upload_store.keys_in(article.cover_url):
+            image_pipeline.enqueue(key, 'cover', user_id=user_id)
+    db.session.commit()
+    for article, _ in articles:
+        db.session.expunge(article)  # 连带评论一起移出会话，内存不随导入的文章数增长
+    result['articles'] += len(posts)
+
+
+def import_blog(user_id, fileobj, filename):
+    """
+    把归档导入到 user_id 名下，返回各类数量。
+    每批单独提交：中途出错时已经导入的批次会保留，返回前抛出 ArchiveError。
+    """
+    _require_yaml()
+    result = {'articles': 0, 'comments': 0, 'uploads': 0}
+    posts = []
+    renamed = {}  # 清理后内容变了的上传文件：{归档里的 key: 新 key}
+    for name, member in iter_members(fileobj, archive_format(filename)):
+        if name == 'blog.yaml':
+            meta = load_yaml(member.read(MAX_POST_SIZE)) or {}
+            # 没有文章的分类和标签也一并建好
+            resolve_terms(Category, user_id, [str(n)[:50] for n in meta.get('categories') or []])
+            resolve_terms(Tag, user_id, [str(n)[:50] for n in meta.get('tags') or []])
+        elif name.startswith('uploads/'):
+            key = _import_upload(name, member, user_id)
+            old_key = name[len('uploads/'):]
+            if key != old_key:
+                renamed[old_key] = key
+            result['uploads'] += 1
+            if result['uploads'] % IMPORT_BATCH == 0:
+                db.session.commit()
+        elif name.endswith('.md'):
+            data = member.read(MAX_POST_SIZE + 1)
+            if len(data) > MAX_POST_SIZE:
+                raise ArchiveError(f'{name} 太大')
+            try:
+                posts.append(parse_post(data.decode('utf-8-sig'), name))
+            except UnicodeDecodeError:
+                raise ArchiveError(f'{name} 不是 UTF-8 编码')
+            if len(posts) >= IMPORT_BATCH:
+                _import_batch(user_id, posts, result, renamed)
+                posts = []
+    if posts:
+        _import_batch(user_id, posts, result, renamed)
+    db.session.commit()
+    return result
@@ -0,0 +1,158 @@
+"""命令行：flask --app app <命令>，由 create_app 注册到 app.cli"""
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from blog_archive import export_blog, import_blog, ArchiveError
+from image_pipeline import has_variants, process_image
+from jobs import job_queue
+from migrations import upgrade_database
+from models import Article, User
+from related import rebuild_related
+from search_index import rebuild_search_index
+from static_export import export_site
+from storage import upload_store
+from views.common import finish_import
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """给旧数据库补齐新增的列、索引和全文索引表，并回填字数等派生数据"""
+    changes, filled = upgrade_database()
+    click.echo(f'新增列/索引: {", ".join(changes) or "无"}')
+    click.echo(f'回填文章统计: {filled} 篇')
+
+
+@click.command('process-images')
+@with_appcontext
+def process_images_command():
+    """给已经上传过的封面和头像补生成缩略图；已经有缩略图的跳过，原图不会被改动"""
+    jobs = [(a.cover_url, 'cover') for a in Article.query.filter(Article.cover_url.isnot(None))]
+    jobs += [(u.avatar_url, 'avatar') for u in User.query.filter(User.avatar_url.isnot(None))]
+    count = 0
+    for url, kind in jobs:
+        path = upload_store.local_path_for_url(url)
+        if path is None and url.startswith('/static/'):
+            path = os.path.join(current_app.root_path, url.lstrip('/'))
+        if path and os.path.exists(path) and not has_variants(path, kind):
+            process_image(path, kind)
+            count += 1
+    click.echo(f'已处理 {count} 张图片')
+
+
+@click.command('run-jobs')
+@with_appcontext
+@click.option('--workers', default=None, type=int, help='工作线程数，默认取 JOBS_WORKERS')
+@click.option('--once', is_flag=True, help='处理完当前到期的任务就退出')
+def run_jobs_command(workers, once):
+    """单独运行后台任务（Web 进程里设置 JOBS_RUN_IN_PROCESS=0 时使用，可以开多个进程）"""
+    if once:
+        click.echo(f'已执行 {job_queue.work(until_empty=True)} 个任务')
+        return
+    current_app.config['JOBS_WORKERS'] = workers or current_app.config['JOBS_WORKERS']
+    job_queue.start()
+    click.echo(f'已启动 {current_app.config["JOBS_WORKERS"]} 个工作线程，Ctrl+C 退出')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        job_queue.stop()
+
+
+@click.command('export-static')
+@with_appcontext
+@click.argument('output_dir', required=False)
+@click.option('--workers', default=None, type=int, help='渲染进程数，默认等于 CPU 核数')
+@click.option('--base-url', default=None, help='sitemap 和 feed 里的站点地址，默认取 SITE_URL')
+@click.option('--force', is_flag=True, help='忽略上次的记录，全部重新渲染')
+def export_static_command(output_dir, workers, base_url, force):
+    """把公开页面增量导出成静态 HTML（外加 sitemap.xml、feed.xml），供 nginx 直接返回"""
+    output_dir = output_dir or os.path.join(current_app.instance_path, 'static_site')
+    # 导出时请求页面不应顺带启动任务线程，首次渲染编译模板也不算慢请求
+    current_app.config['JOBS_RUN_IN_PROCESS'] = False
+    current_app.config['SLOW_REQUEST_THRESHOLD'] = float('inf')
+    result = export_site(current_app._get_current_object(), output_dir,
+                         base_url or current_app.config['SITE_URL'], workers=workers, force=force)
+    click.echo(f'重新渲染 {result["rendered"]} 页，未变化 {result["unchanged"]} 页，删除 {result["removed"]} 页')
+    for url, status in result['failed']:
+        click.echo(f'渲染失败: {url} ({status})')
+
+
+@click.command('export-blog')
+@with_appcontext
+@click.argument('username')
+@click.argument('output')
+def export_blog_command(username, output):
+    """把用户的全部文章导出到 OUTPUT（.zip 或 .tar.gz）"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'用户不存在: {username}')
+    fmt = 'zip' if output.lower().endswith('.zip') else 'tar'
+    with open(output, 'wb') as f:
+        for chunk in export_blog(user.id, fmt):
+            f.write(chunk)
+    click.echo(f'已导出到 {output}')
+
+
+@click.command('import-blog')
+@with_appcontext
+@click.argument('username')
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+def import_blog_command(username, archive):
+    """把 zip / tar 归档里的文章导入到用户名下"""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'用户不存在: {username}')
+    try:
+        with open(archive, 'rb') as f:
+            result = import_blog(user.id, f, archive)
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    finish_import(user.id)
+    click.echo(f'已导入文章 {result["articles"]} 篇、评论 {result["comments"]} 条、'
+               f'上传文件 {result["uploads"]} 个')
+
+
+@click.command('gc-uploads')
+@with_appcontext
+def gc_uploads_command():
+    """删除没有被任何文章或用户引用的上传文件"""
+    click.echo(f'已删除 {upload_store.collect_garbage()} 个文件')
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """重建文章全文索引"""
+    count = rebuild_search_index()
+    click.echo(f'已索引 {count} 篇文章')
+
+
+@click.command('rebuild-related')
+@with_appcontext
+def rebuild_related_command():
+    """全量重建相关文章推荐"""
+    count = rebuild_related()
+    click.echo(f'已计算 {count} 篇文章的相关文章')
+
+
+COMMANDS = [
+    upgrade_db_command,
+    process_images_command,
+    run_jobs_command,
+    export_static_command,
+    export_blog_command,
+    import_blog_command,
+    gc_uploads_command,
+    rebuild_search_index_command,
+    rebuild_related_command,
+]
+
+
+def register_commands(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -0,0 +1,63 @@
+"""
+应用配置。
+
+create_app(config) 依次载入：这里的 Config 默认值 -> 环境变量 BLOG_SETTINGS 指向的配置文件
+（Python 文件，写大写的 KEY = 值）-> 调用方传入的配置类或字典，后面的覆盖前面的。
+密钥一律从环境变量读取，代码里不再写死：生产环境必须设置 SECRET_KEY，AI 摘要需要 DEEPSEEK_API_KEY。
+数据库地址见 db_config.py（默认读取 DATABASE_URL）。
+"""
+import os
+
+
+def _env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY')  # 没有设置时 create_app 生成一个临时的，重启后登录状态失效
+
+    UPLOAD_STORAGE_BACKEND = 'storage.LocalStorage'  # 上传文件存储后端
+    FEED_PER_PAGE = 12  # 首页每页文章数
+    SEARCH_PER_PAGE = 10  # 搜索结果每页条数
+    COMMENTS_PER_PAGE = 20  # 文章页每次加载的评论数
+    COMMENT_MAX_LENGTH = 2000
+    COMMENT_RATE_BURST = 5  # 每个用户可以连续发表的评论数
+    COMMENT_RATE_INTERVAL = 20  # 之后每这么多秒才能再发一条
+    COMMENT_DEDUPE_WINDOW = 600  # 秒；这段时间内在同一篇文章下重复的内容不再保存
+    COMMENT_NOTIFY_DELAY = 60  # 秒；这段时间内的新评论合并成一条提醒
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL')  # 多进程共享限流计数，可选
+    RELATED_PER_PAGE = 5  # 文章页“相关阅读”的条数
+    AUTOSAVE_MAX_REVISIONS = 50  # 每篇文章保留的历史版本数
+    AUTOSAVE_REVISION_INTERVAL = 60  # 这么多秒内的连续自动保存合并成一个历史版本
+    TERM_COUNTERS = True  # 内容云图是否使用物化计数表
+    PAGE_CACHE_TTL = 300  # 匿名页面缓存的兜底过期秒数
+    PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL')  # 多进程共享缓存，可选
+    VIEW_FLUSH_INTERVAL = 10  # 浏览数在内存里攒多少秒再批量写回
+    TRENDING_HALF_LIFE = 48 * 3600  # 热度的半衰期（秒）
+    SITE_NAME = 'LocalBlog'
+    SITE_URL = os.environ.get('SITE_URL', 'http://localhost:5000')  # 静态导出的 sitemap/feed 用绝对地址
+
+    # AI 摘要：上游地址可用环境变量替换成本地测试桩
+    SUMMARY_API_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/chat/completions')
+    SUMMARY_API_KEY = os.environ.get('DEEPSEEK_API_KEY')
+    SUMMARY_MODEL = 'deepseek-chat'
+    SUMMARY_MAX_WORKERS = 2  # 同时进行的上游请求上限
+
+    # 后台任务：默认在 Web 进程里跑；设置 JOBS_RUN_IN_PROCESS=0 后改用 flask run-jobs 单独运行
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_RUN_IN_PROCESS = os.environ.get('JOBS_RUN_IN_PROCESS', '1') != '0'
+
+    # 性能埋点：/metrics 抓取口令、慢请求阈值，以及可以使用 ?profile=1 的管理员用户名
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # 不设置时 /metrics 不开放
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 0.5))
+    ADMIN_USERNAMES = _env_list('ADMIN_USERNAMES')
+
+
+class TestingConfig(Config):
+    """内存数据库，关掉缓存、限流和进程内任务线程，任务用 job_queue.work(until_empty=True) 手动执行"""
+    TESTING = True
+    SECRET_KEY = 'testing'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    PAGE_CACHE_ENABLED = False
+    RATE_LIMIT_ENABLED = False
+    JOBS_RUN_IN_PROCESS = False
@@ -0,0 +1,70 @@
+"""
+数据库连接配置。
+
+- 连接地址取配置里的 SQLALCHEMY_DATABASE_URI，没有配置时从环境变量 DATABASE_URL 读取，默认仍是 instance/blog.db；
+- SQLite 每个新连接都设置 WAL、synchronous=NORMAL、busy_timeout、mmap 和页缓存，
+  读写可以并发，写锁冲突时排队等待而不是立刻报 database is locked；
+- 连接池参数按数据库类型给出合适的默认值，PostgreSQL 等服务器数据库使用较大的池并做存活检测。
+"""
+import math
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URL = 'sqlite:///blog.db'
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # 读不阻塞写，写不阻塞读
+    'synchronous': 'NORMAL',  # WAL 模式下足够安全，提交时少一次 fsync
+    'busy_timeout': 5000,  # 毫秒，等待写锁而不是直接失败
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # 负数单位为 KB，即 32MB 页缓存
+    'temp_store': 'MEMORY',
+}
+
+
+def engine_options(url):
+    """按数据库类型返回 SQLALCHEMY_ENGINE_OPTIONS"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        # 内存数据库（测试用）由 Flask-SQLAlchemy 换成单连接的 StaticPool，不能再设池大小
+        return {'connect_args': {'check_same_thread': False}}
+    if parsed.get_backend_name() == 'sqlite':
+        return {
+            # Python 层面的等锁时间，与 busy_timeout 保持一致
+            'connect_args': {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000, 'check_same_thread': False},
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,  # 避免使用被服务器断开的旧连接
+        'pool_pre_ping': True,
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    # 编译时没有打开数学函数的 SQLite 缺少 ln / exp，写回文章热度时要用
+    try:
+        cursor.execute('SELECT ln(1), exp(0)')
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function('ln', 1, math.log, deterministic=True)
+        dbapi_connection.create_function('exp', 1, math.exp, deterministic=True)
+    cursor.close()
+
+
+def init_database_config(app):
+    """在 db.init_app 之前调用，补上连接地址和连接池参数；配置里已经给出的不覆盖"""
+    url = app.config.get('SQLALCHEMY_DATABASE_URI') or os.environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(url))
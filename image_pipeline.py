@@ -0,0 +1,176 @@
+"""
+上传图片处理流水线。
+
+上传接口先校验，再在计算内容哈希之前清理原图：按 EXIF 方向转正、去掉 EXIF/GPS 等元数据，
+过大的原图缩到 MAX_ORIGINAL_WIDTH。存储按哈希寻址、按 immutable 长期缓存，存进去的文件不能再改，
+所以带定位信息的原始字节从来不会落盘或被返回。扩展名按 Pillow 识别出的格式决定，不用客户端的文件名。
+之后把生成缩略图的工作登记到后台任务队列（jobs.py）：按用途生成不同宽度的 WebP + JPEG 版本，
+文件名形如 <哈希>.thumb.webp / <哈希>.thumb.jpg，是新文件，原图不动。
+模板通过 image_variants() 取已经生成好的版本拼 srcset，没生成完之前回退到原图。
+没有安装 Pillow 时只按扩展名校验，不清理、不生成缩略图。Pillow 在第一次校验或处理图片时才导入。
+"""
+import os
+import tempfile
+
+from jobs import job_queue
+from lazy_imports import optional_import
+from storage import upload_store
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'GIF': '.gif', 'WEBP': '.webp'}
+MAX_PIXELS = 40_000_000  # 约 4000 万像素，防止解压炸弹
+MAX_ORIGINAL_WIDTH = 2000  # 原图（正文插图直接引用）的最大宽度
+# Pillow 读出的这些 info 字段只描述编码方式，不含 EXIF、XMP、ICC、文本注释之类的元数据
+HARMLESS_INFO = {'jfif', 'jfif_version', 'jfif_unit', 'jfif_density', 'dpi', 'progressive', 'progression',
+                 'loop', 'background', 'version', 'duration', 'transparency', 'gamma', 'aspect', 'interlace'}
+
+# 不同用途需要的尺寸：(版本名, 最大宽度)
+VARIANTS = {
+    'cover': [('thumb', 600), ('detail', 1200)],  # 首页卡片 / 文章页头图
+    'article': [],  # 正文插图直接引用原图，只做元数据清理和缩放
+    'avatar': [('avatar', 64), ('avatar2x', 128)],  # 头像（正方形裁剪）
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def validate_image(file):
+    """
+    检查上传文件是否为允许的图片，不合格时抛出 InvalidImage。
+    返回存储用的扩展名：装了 Pillow 时按识别出的格式决定，否则取文件名里的（已经过白名单检查）。
+    """
+    ext = os.path.splitext(file.filename or '')[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise InvalidImage('不支持的图片格式')
+    Image = optional_import('PIL.Image')
+    if Image is None:
+        return ext
+
+    try:
+        with Image.open(file.stream) as img:
+            if img.format not in ALLOWED_FORMATS:
+                raise InvalidImage('不支持的图片格式')
+            if img.width * img.height > MAX_PIXELS:
+                raise InvalidImage('图片尺寸过大')
+            img.verify()
+            return FORMAT_EXTENSIONS[img.format]
+    except InvalidImage:
+        raise
+    except Exception:
+        raise InvalidImage('图片文件已损坏')
+    finally:
+        file.stream.seek(0)
+
+
+def variant_path(path, variant, ext):
+    root, _ = os.path.splitext(path)
+    return f'{root}.{variant}.{ext}'
+
+
+def clean_upload(file):
+    """
+    上传时、计算哈希之前调用（file 已经过 validate_image）：按 EXIF 方向转正、限制宽度后重新编码，
+    丢掉 EXIF/GPS 等元数据，返回可读的二进制流。已经干净的图片（比如本站导出后再导入的）不重新编码，
+    内容和地址保持不变；动图和没装 Pillow 时原样返回 file.stream。
+    """
+    Image, ImageOps = optional_import('PIL.Image'), optional_import('PIL.ImageOps')
+    if Image is None:
+        return file.stream
+    with Image.open(file.stream) as img:
+        clean_already = (img.width <= MAX_ORIGINAL_WIDTH and set(img.info) <= HARMLESS_INFO
+                         and not img.getexif())
+        if clean_already or getattr(img, 'is_animated', False):
+            file.stream.seek(0)
+            return file.stream
+        fmt = img.format
+        clean = ImageOps.exif_transpose(img)
+        if clean.width > MAX_ORIGINAL_WIDTH:
+            clean.thumbnail((MAX_ORIGINAL_WIDTH, MAX_ORIGINAL_WIDTH * 4), Image.LANCZOS)
+        # 元数据全部丢掉，只保留调色板图片的透明色，否则透明背景会变成不透明
+        clean.info = {k: v for k, v in clean.info.items() if k == 'transparency'}
+        out = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+        clean.save(out, format=fmt, **({'quality': 90} if fmt == 'JPEG' else {}))
+    out.seek(0)
+    return out
+
+
+def make_variants(path, kind):
+    """生成该用途需要的全部缩略图，返回生成的文件列表"""
+    Image, ImageOps = optional_import('PIL.Image'), optional_import('PIL.ImageOps')
+    created = []
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert('RGBA')
+        for variant, width in VARIANTS[kind]:
+            if kind == 'avatar':
+                resized = ImageOps.fit(img, (width, width), Image.LANCZOS)
+            else:
+                resized = img.copy()
+                resized.thumbnail((width, width * 4), Image.LANCZOS)
+
+            # WebP 保留透明通道；JPEG 不支持透明，铺在白底上
+            webp = variant_path(path, variant, 'webp')
+            resized.save(webp, quality=80, method=4)
+            flat = Image.new('RGB', resized.size, 'white')
+            flat.paste(resized, mask=resized.getchannel('A'))
+            jpg = variant_path(path, variant, 'jpg')
+            flat.save(jpg, quality=82, optimize=True, progressive=True)
+            created += [webp, jpg]
+    return created
+
+
+def has_variants(path, kind):
+    return all(os.path.exists(variant_path(path, variant, 'webp')) for variant, _ in VARIANTS[kind])
+
+
+def process_image(path, kind):
+    """生成缩略图（都是新文件，原图不动）；已经生成过的不再重复生成"""
+    if optional_import('PIL.Image') is None or has_variants(path, kind):
+        return []
+    return make_variants(path, kind)
+
+
+class ImagePipeline:
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.jinja_env.globals['image_variants'] = self.variants_for
+        job_queue.register('image.process', self.process_upload)
+
+    def enqueue(self, key, kind, user_id=None):
+        """登记生成缩略图的后台任务；文件不在本地（比如对象存储）或用途不需要缩略图时不登记。调用方负责提交"""
+        if VARIANTS[kind] and upload_store.local_path_for_url(upload_store.url(key)):
+            job_queue.enqueue('image.process', {'url': upload_store.url(key), 'kind': kind},
+                              key=f'image:{key}:{kind}', user_id=user_id)
+
+    def process_upload(self, url, kind):
+        """后台任务：按用途生成缩略图（原图在上传时就清理好了）"""
+        path = upload_store.local_path_for_url(url)
+        if path and os.path.exists(path):
+            process_image(path, kind)
+
+    def variants_for(self, url, kind):
+        """
+        给模板用：返回已经生成好的版本 [(宽度, webp地址, jpg地址), ...]。
+        外链图片或还没处理完时返回空列表，模板直接用原图。
+        """
+        local = upload_store.local_path_for_url(url)
+        if local is None:
+            if not url or not url.startswith('/static/'):
+                return []
+            local = os.path.join(self.app.root_path, url.lstrip('/'))
+        found = []
+        for variant, width in VARIANTS[kind]:
+            if os.path.exists(variant_path(local, variant, 'webp')):
+                found.append((width, variant_path(url, variant, 'webp'), variant_path(url, variant, 'jpg')))
+        return found
+
+
+image_pipeline = ImagePipeline()
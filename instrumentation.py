@@ -0,0 +1,272 @@
+"""
+请求级性能埋点。
+
+每个请求记录：总耗时、SQL 条数与耗时（SQLAlchemy 引擎事件）、模板渲染耗时，
+可选记录 Python 内存分配（tracemalloc，开销较大，默认关闭）。
+- 按路由端点汇总成直方图，/metrics 以 Prometheus 文本格式输出，抓取时要带 METRICS_TOKEN，
+  没有配置 METRICS_TOKEN 时这个地址不开放（404）；
+- 超过 SLOW_REQUEST_THRESHOLD 秒的请求连同它执行的 SQL 写进日志；
+- 管理员（ADMIN_USERNAMES）访问任意页面时加 ?profile=1，返回该请求的 cProfile 结果，
+  再加 &format=prof 下载原始 .prof 文件，可用 snakeviz / flameprof 等工具看火焰图。
+指标保存在进程内存里，多进程部署时每个进程分别被抓取。
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+
+from flask import Response, abort, g, has_request_context, request, template_rendered, before_render_template
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20, 64 << 20)
+
+MAX_LOGGED_QUERIES = 50  # 每个请求最多保留多少条 SQL 供慢请求日志使用
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # 标签值 -> [各桶计数..., 总和, 次数]
+
+    def observe(self, label_values, value):
+        row = self._values.get(label_values)
+        if row is None:
+            row = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for label_values, row in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, row):
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {row[-1]}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {row[-2]}')
+            lines.append(f'{self.name}_count{labels} {row[-1]}')
+        return lines
+
+
+class RequestStats:
+    """单个请求的统计，挂在 g.request_stats 上"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.queries = []  # (耗时, SQL)
+        self.template_time = 0.0
+        self.template_started = []
+        self.memory_start = None
+
+
+# --- SQLAlchemy 事件：对所有引擎生效，只在请求上下文里计数 ---
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if not has_request_context():
+        return
+    stats = g.get('request_stats')
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.query_count += 1
+    stats.query_time += elapsed
+    if len(stats.queries) < MAX_LOGGED_QUERIES:
+        stats.queries.append((elapsed, statement))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _on_query_error(context):
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def _on_before_render(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None:
+        stats.template_started.append(time.perf_counter())
+
+
+def _on_rendered(sender, template, context, **extra):
+    stats = g.get('request_stats')
+    if stats is not None and stats.template_started:
+        stats.template_time += time.perf_counter() - stats.template_started.pop()
+
+
+class Instrumentation:
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self.requests = Counter('blog_requests_total', '按端点、方法、状态码统计的请求数',
+                                ('endpoint', 'method', 'status'))
+        self.duration = Histogram('blog_request_duration_seconds', '请求总耗时', ('endpoint',), DURATION_BUCKETS)
+        self.query_count = Histogram('blog_request_sql_queries', '每个请求执行的 SQL 条数', ('endpoint',), QUERY_BUCKETS)
+        self.query_time = Histogram('blog_request_sql_seconds', '每个请求的 SQL 总耗时', ('endpoint',), DURATION_BUCKETS)
+        self.template_time = Histogram('blog_request_template_seconds', '每个请求的模板渲染耗时', ('endpoint',),
+                                       DURATION_BUCKETS)
+        self.allocated = Histogram('blog_request_allocated_bytes', '每个请求的 Python 内存分配峰值（近似值）',
+                                   ('endpoint',), BYTES_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_TOKEN', None)  # 设置后 /metrics 需要 Authorization: Bearer <token>
+        app.config.setdefault('METRICS_TRACE_MALLOC', False)
+        app.config.setdefault('SLOW_REQUEST_THRESHOLD', 0.5)
+        app.config.setdefault('ADMIN_USERNAMES', ())
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        if app.config['METRICS_TRACE_MALLOC'] and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(_on_before_render, app)
+        template_rendered.connect(_on_rendered, app)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # --- 请求钩子 ---
+    def _before_request(self):
+        stats = g.request_stats = RequestStats()
+        if tracemalloc.is_tracing():
+            # 峰值是全进程的，并发请求时只是近似值
+            tracemalloc.reset_peak()
+            stats.memory_start = tracemalloc.get_traced_memory()[0]
+        if request.args.get('profile') == '1' and self._is_admin():
+            g.profiler = cProfile.Profile()
+            try:
+                g.profiler.enable()
+            except ValueError:  # 同一线程里已经有别的分析器在运行
+                g.profiler = None
+
+    def _after_request(self, response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+
+        with self._lock:
+            self.requests.inc((endpoint, request.method, str(response.status_code)))
+            self.duration.observe((endpoint,), elapsed)
+            self.query_count.observe((endpoint,), stats.query_count)
+            self.query_time.observe((endpoint,), stats.query_time)
+            self.template_time.observe((endpoint,), stats.template_time)
+            if stats.memory_start is not None:
+                self.allocated.observe((endpoint,), max(0, tracemalloc.get_traced_memory()[1] - stats.memory_start))
+
+        if elapsed >= self.app.config['SLOW_REQUEST_THRESHOLD']:
+            self._log_slow_request(elapsed, stats)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            return self._profile_response(profiler, stats, elapsed)
+        return response
+
+    def _is_admin(self):
+        return current_user.is_authenticated and current_user.username in self.app.config['ADMIN_USERNAMES']
+
+    def _log_slow_request(self, elapsed, stats):
+        lines = [f'  {t * 1000:8.1f}ms  {" ".join(sql.split())}' for t, sql in stats.queries]
+        if stats.query_count > len(stats.queries):
+            lines.append(f'  ... 另有 {stats.query_count - len(stats.queries)} 条')
+        self.app.logger.warning(
+            '慢请求 %s %s: %.0fms, SQL %d 条 / %.0fms, 模板 %.0fms\n%s',
+            request.method, request.full_path, elapsed * 1000, stats.query_count,
+            stats.query_time * 1000, stats.template_time * 1000, '\n'.join(lines))
+
+    @staticmethod
+    def _profile_response(profiler, stats, elapsed):
+        if request.args.get('format') == 'prof':
+            # .prof 文件就是 marshal 序列化后的 stats 字典，与 cProfile.Profile.dump_stats 一致
+            profiler.create_stats()
+            return Response(marshal.dumps(profiler.stats), mimetype='application/octet-stream', headers={
+                'Content-Disposition': f'attachment; filename="{request.endpoint or "request"}.prof"'})
+
+        out = io.StringIO()
+        out.write(f'{request.method} {request.full_path}  {elapsed * 1000:.1f}ms  '
+                  f'SQL {stats.query_count} 条 / {stats.query_time * 1000:.1f}ms  '
+                  f'模板 {stats.template_time * 1000:.1f}ms\n\n')
+        for t, sql in stats.queries:
+            out.write(f'{t * 1000:8.2f}ms  {" ".join(sql.split())}\n')
+        out.write('\n')
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(60)
+        return Response(out.getvalue(), mimetype='text/plain')
+
+    # --- /metrics ---
+    def metrics_view(self):
+        token = self.app.config['METRICS_TOKEN']
+        if not token:
+            # 反向代理后面 remote_addr 都是本机，不能据此判断来源，没配置口令就不开放
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            abort(403)
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    def render_metrics(self):
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.duration, self.query_count, self.query_time,
+                           self.template_time, self.allocated):
+                lines += metric.expose()
+        return '\n'.join(lines) + '\n'
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,190 @@
+"""
+持久化的后台任务队列。
+
+保存文章、上传图片之后的派生工作（全文索引、缩略图、云图计数、渲染缓存预热、AI 摘要、
+清理无用上传文件）不再在请求里同步完成，而是登记成 Job 表里的一行，请求立即返回：
+- 任务和触发它的修改在同一个事务里提交，回滚时任务也不会存在；
+- 带幂等键的任务在排队期间合并，连续保存十次只会重建一次索引；
+- 工作线程用条件 UPDATE 领取任务并加租约，多个进程同时跑也不会重复执行；
+- 失败按指数退避（带随机抖动）重试，超过次数标记为 failed，错误信息留在 last_error；
+- 进程崩溃留下的 running 任务在租约过期后会被重新领取。
+默认在 Web 进程里起 JOBS_WORKERS 个线程处理；设置 JOBS_RUN_IN_PROCESS=False 后
+改用 `flask --app app run-jobs` 单独运行，可以开多个进程。
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, Job, insert_ignoring_conflicts
+
+
+class JobQueue:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tasks = {}  # 任务名 -> (函数, 最多尝试次数)
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOBS_WORKERS', 2)
+        app.config.setdefault('JOBS_RUN_IN_PROCESS', True)  # 关闭后需要单独运行 flask run-jobs
+        app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)  # 队列为空时多久查一次
+        app.config.setdefault('JOBS_LEASE', 300)  # 秒；执行超过这个时间的任务会被当成已崩溃
+        app.config.setdefault('JOBS_RETRY_DELAY', 5)  # 第一次重试的等待秒数，之后每次翻倍
+        app.config.setdefault('JOBS_RETRY_MAX_DELAY', 600)
+        app.config.setdefault('JOBS_KEEP_DAYS', 7)  # 已结束的任务保留天数
+        # 第一个请求到来时再起线程，flask 命令行（升级数据库等）不会顺带跑任务
+        app.before_request(self._start_in_process)
+
+    # --- 注册和登记 ---
+    def task(self, name, max_attempts=3):
+        """注册任务函数的装饰器；函数用关键字参数接收 payload，抛异常即视为失败"""
+        def decorator(func):
+            self.register(name, func, max_attempts)
+            return func
+        return decorator
+
+    def register(self, name, func, max_attempts=3):
+        self.tasks[name] = (func, max_attempts)
+
+    def enqueue(self, name, payload=None, key=None, delay=0, user_id=None):
+        """
+        在调用方的事务里登记任务并返回 Job，调用方提交后才会被执行。
+        key 相同且还在排队的任务直接返回已有的那个。
+        """
+        if name not in self.tasks:
+            raise KeyError(f'未注册的任务: {name}')
+        now = datetime.now()
+        row = {
+            'name': name, 'payload': json.dumps(payload or {}, ensure_ascii=False, sort_keys=True),
+            'key': key, 'status': 'queued', 'attempts': 0, 'max_attempts': self.tasks[name][1],
+            'run_at': now + timedelta(seconds=delay), 'user_id': user_id, 'created_at': now,
+        }
+        if key is None:
+            job = Job(**row)
+            db.session.add(job)
+            db.session.flush()
+            return job
+        insert_ignoring_conflicts(Job, [row])
+        return Job.query.filter_by(key=key, status='queued').first()
+
+    # --- 工作线程 ---
+    def start(self):
+        """启动进程内的工作线程（重复调用无副作用）"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.app.config['JOBS_WORKERS']):
+                thread = threading.Thread(target=self.work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _start_in_process(self):
+        if not self._threads and self.app.config['JOBS_RUN_IN_PROCESS']:
+            self.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def work(self, until_empty=False):
+        """
+        工作循环：领取并执行任务，队列为空时等待 JOBS_POLL_INTERVAL 秒。
+        until_empty 为真时队列里没有可执行的任务就返回，返回执行过的任务数。
+        """
+        done = 0
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    job = self._claim()
+                    if job is not None:
+                        self._execute(job)
+                        done += 1
+                        continue
+                    self._maybe_prune()
+                except Exception:
+                    # 数据库暂时不可用等情况：记下来，稍后再试，不能让线程退出
+                    db.session.rollback()
+                    self.app.logger.exception('任务队列出错')
+            if until_empty:
+                return done
+            self._stop.wait(self.app.config['JOBS_POLL_INTERVAL'])
+        return done
+
+    def _claim(self):
+        """领取一个到期的任务：先查候选，再用带条件的 UPDATE 抢占，抢到的返回 Job"""
+        now = datetime.now()
+        ready = db.or_(db.and_(Job.status == 'queued', Job.run_at <= now),
+                       db.and_(Job.status == 'running', Job.locked_until < now))
+        candidates = [row[0] for row in db.session.query(Job.id).filter(ready)
+                      .order_by(Job.run_at, Job.id).limit(5)]
+        db.session.rollback()
+        for job_id in candidates:
+            claimed = Job.query.filter(Job.id == job_id, ready).update({
+                Job.status: 'running',
+                Job.attempts: Job.attempts + 1,
+                Job.locked_until: now + timedelta(seconds=self.app.config['JOBS_LEASE']),
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _execute(self, job):
+        job_id, name, attempts, max_attempts = job.id, job.name, job.attempts, job.max_attempts
+        func = self.tasks.get(name, (None, 0))[0]
+        try:
+            if func is None:
+                raise LookupError(f'未注册的任务: {name}')
+            if attempts > max_attempts:
+                raise RuntimeError('执行期间进程多次中断')
+            func(**json.loads(job.payload))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.warning('任务 %s#%s 第 %s 次执行失败: %s', name, job_id, attempts, e,
+                                    exc_info=attempts >= max_attempts)
+            self._fail(job_id, attempts, max_attempts, f'{type(e).__name__}: {e}')
+            return
+        Job.query.filter_by(id=job_id).update({
+            Job.status: 'done', Job.finished_at: datetime.now(), Job.locked_until: None, Job.last_error: None,
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def _fail(self, job_id, attempts, max_attempts, error):
+        job = db.session.get(Job, job_id)
+        # 执行期间又登记了同一个键的新任务时由它接手，这个不再重试
+        superseded = job.key is not None and Job.query.filter(
+            Job.key == job.key, Job.status == 'queued', Job.id != job_id).count() > 0
+        job.last_error = error[:2000]
+        job.locked_until = None
+        if attempts < max_attempts and not superseded:
+            delay = self.app.config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+            job.run_at = datetime.now() + timedelta(seconds=min(delay, self.app.config['JOBS_RETRY_MAX_DELAY']))
+            job.status = 'queued'
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.now()
+        db.session.commit()
+
+    def _maybe_prune(self):
+        """每小时删除一次早已结束的任务，防止表无限增长"""
+        if time.monotonic() - self._last_prune < 3600:
+            return
+        self._last_prune = time.monotonic()
+        before = datetime.now() - timedelta(days=self.app.config['JOBS_KEEP_DAYS'])
+        Job.query.filter(Job.status.in_(['done', 'failed']), Job.finished_at < before) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+
+job_queue = JobQueue()
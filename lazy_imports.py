@@ -0,0 +1,23 @@
+"""
+可选依赖的延迟导入。
+
+markdown / bleach、Pillow、PyYAML、requests、numpy / scipy 的导入占了启动时间的一大半，
+而大部分请求根本用不到它们。用到它们的模块不在顶部导入，而是在第一次真正使用时：
+    yaml = optional_import('yaml')  # 没有安装时返回 None
+结果会缓存，之后的调用只是一次字典查找。gunicorn --preload 部署时 app.warm_up() 在 fork
+之前把它们提前导入，所有 worker 共享同一份已加载的模块。
+"""
+import importlib
+from functools import lru_cache
+
+# warm_up() 预先导入的模块，都是可选的
+HEAVY_MODULES = ('markdown', 'bleach', 'PIL.Image', 'PIL.ImageOps', 'yaml', 'requests', 'numpy', 'scipy.sparse')
+
+
+@lru_cache(maxsize=None)
+def optional_import(name):
+    """导入并返回模块，没有安装时返回 None"""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
@@ -0,0 +1,147 @@
+"""
+服务端 Markdown 渲染。
+
+文章页原来把 Markdown 原文交给浏览器里的 Editor.md 解析，
+现在改为服务端渲染成经过清洗的 HTML（连同目录），并按 (文章id, 正文哈希) 缓存：
+内存里一份 LRU，instance 目录下再落一份磁盘缓存，多进程/重启后也能直接命中。
+没有安装 markdown / bleach 时 render_article 返回 None，模板自动退回前端渲染。
+两个库在第一次渲染时才导入，不拖慢启动。
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from lazy_imports import optional_import
+
+# 清洗后允许保留的标签和属性
+ALLOWED_TAGS = [
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'strong', 'em', 'b', 'i', 'del', 's', 'sup', 'sub', 'mark',
+    'a', 'img', 'ul', 'ol', 'li', 'blockquote', 'pre', 'code', 'span', 'div',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+]
+ALLOWED_ATTRIBUTES = {
+    '*': ['class', 'id'],
+    'a': ['href', 'title'],
+    'img': ['src', 'alt', 'title'],
+    'th': ['align'],
+    'td': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+# 这些写法依赖 Editor.md 的前端插件（公式、流程图、时序图），服务端渲染不了
+CLIENT_ONLY_MARKERS = ('```flow', '```seq', '$$')
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()[:16]
+
+
+def needs_client_render(content):
+    return any(marker in (content or '') for marker in CLIENT_ONLY_MARKERS)
+
+
+def markdown_available():
+    """可选依赖 markdown 和 bleach 是否都已安装，缺失时走前端渲染"""
+    return optional_import('markdown') is not None and optional_import('bleach') is not None
+
+
+def render_markdown(content):
+    """把 Markdown 渲染成 {'html': 正文, 'toc': 目录}，已做 XSS 清洗"""
+    markdown, bleach = optional_import('markdown'), optional_import('bleach')
+    md = markdown.Markdown(
+        extensions=['extra', 'sane_lists', 'toc'],
+        extension_configs={'toc': {'toc_class': 'markdown-toc-list', 'toc_depth': '1-6'}}
+    )
+    html = md.convert(content or '')
+    clean = dict(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS, strip=True)
+    return {
+        'html': bleach.clean(html, **clean),
+        'toc': bleach.clean(md.toc, **clean) if md.toc_tokens else '',
+    }
+
+
+class MarkdownCache:
+    """渲染结果缓存：进程内 LRU + 可选的磁盘缓存"""
+
+    def __init__(self, app=None):
+        self.max_size = 256
+        self.cache_dir = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.setdefault('MARKDOWN_CACHE_SIZE', 256)
+        self.cache_dir = app.config.setdefault('MARKDOWN_CACHE_DIR', os.path.join(app.instance_path, 'render_cache'))
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _disk_path(self, article_id, digest):
+        return os.path.join(self.cache_dir, f'{article_id}-{digest}.json')
+
+    def get(self, article_id, digest):
+        key = (article_id, digest)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(article_id, digest), encoding='utf-8') as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(key, value)
+            return value
+        return None
+
+    def set(self, article_id, digest, value):
+        self._remember((article_id, digest), value)
+        if self.cache_dir:
+            # 先写临时文件再改名，避免其它进程读到写了一半的文件
+            path = self._disk_path(article_id, digest)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, article_id):
+        """文章编辑或删除后清掉它的所有旧版本"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == article_id]:
+                del self._entries[key]
+        if self.cache_dir:
+            for path in glob.glob(os.path.join(self.cache_dir, f'{article_id}-*.json')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+render_cache = MarkdownCache()
+
+
+def render_article(article):
+    """取文章的渲染结果，没有缓存时现场渲染；无法服务端渲染时返回 None"""
+    if not markdown_available() or needs_client_render(article.content):
+        return None
+
+    digest = content_hash(article.content)
+    rendered = render_cache.get(article.id, digest)
+    if rendered is None:
+        rendered = render_markdown(article.content)
+        render_cache.set(article.id, digest, rendered)
+    return rendered
@@ -0,0 +1,138 @@
+"""
+轻量级的数据库升级工具。
+
+项目没有引入 Alembic，db.create_all() 又只会建新表、不会给旧表加列，
+所以这里对照 models.py 里的定义，把旧数据库缺少的列和索引补上，再回填派生数据。
+只做“加法”，不会删除或修改已有的列。
+"""
+from sqlalchemy import bindparam, inspect, text, update
+from models import db, Article, Category, Comment, Tag, article_tags, count_words, estimate_read_time, make_excerpt
+from related import backfill_related_index
+from search_index import FTS_TABLE, ensure_search_index
+from term_counts import backfill_term_counts
+
+
+def upgrade_schema():
+    """补齐缺失的表、列和索引，返回执行过的变更描述"""
+    db.create_all()
+    inspector = inspect(db.engine)
+    changes = []
+
+    for table in db.metadata.sorted_tables:
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+            changes.append(f'{table.name}.{column.name}')
+
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(bind=db.session.connection())
+                changes.append(index.name)
+
+    db.session.commit()
+    return changes
+
+
+def merge_duplicate_terms():
+    """
+    合并同一用户下重名的分类/标签（旧代码并发保存时可能产生），
+    否则无法建立 (user_id, name) 唯一索引。返回合并掉的记录数。
+    """
+    inspector = inspect(db.engine)
+    merged = 0
+    for model in (Category, Tag):
+        if not inspector.has_table(model.__tablename__):
+            continue
+        groups = db.session.query(model.user_id, model.name, db.func.min(model.id)) \
+            .group_by(model.user_id, model.name).having(db.func.count(model.id) > 1).all()
+        for user_id, name, keep_id in groups:
+            duplicate_ids = [row[0] for row in db.session.query(model.id).filter(
+                model.user_id == user_id, model.name == name, model.id != keep_id)]
+            if model is Category:
+                Article.query.filter(Article.category_id.in_(duplicate_ids)) \
+                    .update({Article.category_id: keep_id, Article.update_time: Article.update_time},
+                            synchronize_session=False)
+            else:
+                # 先删掉会变成重复的关联，再把其余关联指向保留的标签
+                kept_articles = db.session.query(article_tags.c.article_id).filter(article_tags.c.tag_id == keep_id)
+                db.session.execute(article_tags.delete().where(
+                    article_tags.c.tag_id.in_(duplicate_ids), article_tags.c.article_id.in_(kept_articles)))
+                db.session.execute(article_tags.update().where(
+                    article_tags.c.tag_id.in_(duplicate_ids)).values(tag_id=keep_id))
+            model.query.filter(model.id.in_(duplicate_ids)).delete(synchronize_session=False)
+            merged += len(duplicate_ids)
+    db.session.commit()
+    return merged
+
+
+def backfill_article_metrics(batch_size=500):
+    """
+    给还没有字数统计或摘录的旧文章补算 word_count / read_time / excerpt。
+    只读需要的列、用批量 UPDATE 写回，不经过 ORM 对象，文章的更新时间保持不变
+    """
+    table = Article.__table__
+    statement = update(table).where(table.c.id == bindparam('b_id')).values(
+        word_count=bindparam('b_words'), read_time=bindparam('b_minutes'), excerpt=bindparam('b_excerpt'),
+        update_time=table.c.update_time,
+    )
+    total = 0
+    while True:
+        batch = db.session.query(Article.id, Article.content) \
+            .filter(db.or_(Article.word_count.is_(None), Article.excerpt.is_(None))).limit(batch_size).all()
+        if not batch:
+            break
+        rows = []
+        for article_id, content in batch:
+            word_count = count_words(content or '')
+            rows.append({'b_id': article_id, 'b_words': word_count, 'b_minutes': estimate_read_time(word_count),
+                         'b_excerpt': make_excerpt(content or '')})
+        db.session.connection().execute(statement, rows)
+        db.session.commit()
+        total += len(batch)
+    return total
+
+
+def backfill_comment_counts():
+    """给旧文章补上 comment_count，一条 UPDATE 完成，返回更新的行数"""
+    counts = db.session.query(db.func.count(Comment.id)).filter(Comment.article_id == Article.id).scalar_subquery()
+    result = Article.query.filter(Article.comment_count.is_(None)) \
+        .update({Article.comment_count: counts, Article.update_time: Article.update_time}, synchronize_session=False)
+    db.session.commit()
+    return result
+
+
+def backfill_article_versions():
+    """旧文章没有版本号，统一置为 0，自动保存的条件 UPDATE 才能匹配"""
+    result = Article.query.filter(Article.version.is_(None)) \
+        .update({Article.version: 0, Article.update_time: Article.update_time}, synchronize_session=False)
+    db.session.commit()
+    return result
+
+
+def backfill_view_counters():
+    """旧文章没有浏览数和热度，置为 0，写回时的 UPDATE 才能在原值上累加"""
+    result = Article.query.filter(db.or_(Article.view_count.is_(None), Article.trending_score.is_(None))) \
+        .update({Article.view_count: db.func.coalesce(Article.view_count, 0),
+                 Article.trending_score: db.func.coalesce(Article.trending_score, 0.0),
+                 Article.update_time: Article.update_time}, synchronize_session=False)
+    db.session.commit()
+    return result
+
+
+def upgrade_database():
+    """升级表结构并回填所有派生数据"""
+    merge_duplicate_terms()
+    changes = upgrade_schema()
+    if ensure_search_index() is not None:  # 全文索引是虚表，create_all 建不了，新建后顺带写入已有文章
+        changes.append(FTS_TABLE)
+    filled = backfill_article_metrics()
+    backfill_comment_counts()
+    backfill_article_versions()
+    backfill_view_counters()
+    backfill_term_counts()
+    backfill_related_index()
+    return changes, filled
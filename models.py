@@ -1,14 +1,85 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import event
 from datetime import datetime
 import re
 
 db = SQLAlchemy()
 
+
+def insert_ignoring_conflicts(model, rows):
+    """批量插入，遇到唯一约束冲突的行跳过；在调用方的事务里执行，不提交"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        db.session.add_all([model(**row) for row in rows])
+        db.session.flush()
+        return
+    db.session.execute(insert(model).values(rows).on_conflict_do_nothing())
+
+# 统计字数时需要去掉的 Markdown 标记，预先编译好
+_CODE_BLOCK_RE = re.compile(r'```.*?```', re.DOTALL)
+_IMAGE_RE = re.compile(r'!\[.*?\]\(.*?\)')
+_LINK_RE = re.compile(r'\[(.*?)\]\(.*?\)')
+_HEADING_RE = re.compile(r'#+\s?')
+_EMPHASIS_RE = re.compile(r'(\*\*|__|[\*_])')
+_BULLET_RE = re.compile(r'^\s*[\->\*+]\s+', re.MULTILINE)
+_ORDERED_RE = re.compile(r'^\s*\d+\.\s+', re.MULTILINE)
+_HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+
+EXCERPT_LENGTH = 150  # 列表页自动摘要的字数
+
+
+def strip_markdown(content):
+    """去掉 Markdown 符号和 HTML 标签，返回纯文本（保留原有空白）"""
+    if not content:
+        return ''
+
+    # 去掉代码块 (```...```)
+    text = _CODE_BLOCK_RE.sub('', content)
+    # 去掉图片 (![alt](url))
+    text = _IMAGE_RE.sub('', text)
+    # 去掉链接，只保留链接文字 ([text](url) -> text)
+    text = _LINK_RE.sub(r'\1', text)
+    # 去掉标题符号 (# ## ###)
+    text = _HEADING_RE.sub('', text)
+    # 去掉粗体、斜体 (** * __ _)
+    text = _EMPHASIS_RE.sub('', text)
+    # 去掉列表符号 (- * + 1. 2.)
+    text = _BULLET_RE.sub('', text)
+    text = _ORDERED_RE.sub('', text)
+    # 去掉 HTML 标签
+    return _HTML_TAG_RE.sub('', text)
+
+
+def count_words(content):
+    """计算去除 Markdown 符号后的纯文字字数"""
+    # 去掉多余的换行和空格
+    return len("".join(strip_markdown(content).split()))
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """列表页没有手动摘要时显示的纯文本摘录，保存时生成"""
+    return " ".join(strip_markdown(content).split())[:length]
+
+
+def estimate_read_time(word_count):
+    """估算阅读时间"""
+    # 中文阅读速度通常为 300-500 字/分钟
+    minutes = round((word_count or 0) / 400)
+    return minutes if minutes > 0 else 1
+
+
 # 文章与标签的多对多关联表
 article_tags = db.Table('article_tags',
                         db.Column('article_id', db.Integer, db.ForeignKey('article.id')),
-                        db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'))
+                        db.Column('tag_id', db.Integer, db.ForeignKey('tag.id')),
+                        db.Index('ix_article_tags_article', 'article_id'),
+                        db.Index('ix_article_tags_tag', 'tag_id')
                         )
 
 
@@ -35,65 +106,68 @@ class Category(db.Model):
     name = db.Column(db.String(50), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # 同一用户下分类不重名，也是批量创建时判断冲突的依据
+    __table_args__ = (
+        db.Index('uq_category_user_name', 'user_id', 'name', unique=True),
+    )
+
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('uq_tag_user_name', 'user_id', 'name', unique=True),
+    )
+
 
 class Article(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     summary = db.Column(db.Text)
-    content = db.Column(db.Text, nullable=False)
+    # 正文默认延迟加载：列表页只用 excerpt，需要正文的地方用 undefer(Article.content) 或按需单独加载
+    content = db.deferred(db.Column(db.Text, nullable=False))
+    excerpt = db.Column(db.String(EXCERPT_LENGTH))  # 纯文本摘录，保存时生成
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'))
     is_draft = db.Column(db.Boolean, default=False)  # 新增：是否为草稿
     update_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
     cover_url = db.Column(db.String(256))
+    word_count = db.Column(db.Integer, default=0)  # 纯文字字数，保存时计算
+    read_time = db.Column(db.Integer, default=1)  # 预计阅读分钟数
+    comment_count = db.Column(db.Integer, default=0)  # 评论数，发表评论时累加，避免每次 count
+    version = db.Column(db.Integer, default=0)  # 正文版本号，自动保存时做乐观并发校验
+    # 浏览数和热度由 view_counter 在内存里累计后批量写回，热度的含义见 view_counter.py
+    view_count = db.Column(db.Integer, default=0)
+    trending_score = db.Column(db.Float, default=0.0)
 
     category = db.relationship('Category', backref='posts')
     tags = db.relationship('Tag', secondary=article_tags, backref=db.backref('articles', lazy='dynamic'))
-    comments = db.relationship('Comment', backref='target_article', lazy=True, cascade="all, delete-orphan")
-
-    @property
-    def word_count(self):
-        """计算去除 Markdown 符号后的纯文字字数"""
-        if not self.content:
-            return 0
-
-        # 1. 拷贝一份正文内容进行清理
-        text = self.content
-
-        # 2. 正则过滤逻辑
-        # 去掉代码块 (```...```)
-        text = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
-        # 去掉图片 (![alt](url))
-        text = re.sub(r'!\[.*?\]\(.*?\)', '', text)
-        # 去掉链接，只保留链接文字 ([text](url) -> text)
-        text = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', text)
-        # 去掉标题符号 (# ## ###)
-        text = re.sub(r'#+\s?', '', text)
-        # 去掉粗体、斜体 (** * __ _)
-        text = re.sub(r'(\*\*|__|[\*_])', '', text)
-        # 去掉列表符号 (- * + 1. 2.)
-        text = re.sub(r'^\s*[\->\*+]\s+', '', text, flags=re.MULTILINE)
-        text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-        # 去掉 HTML 标签
-        text = re.sub(r'<[^>]*>', '', text)
-        # 去掉多余的换行和空格
-        text = "".join(text.split())
-
-        return len(text)
-
-    @property
-    def read_time(self):
-        """估算阅读时间"""
-        count = self.word_count
-        # 中文阅读速度通常为 300-500 字/分钟
-        minutes = round(count / 400)
-        return minutes if minutes > 0 else 1
+    # 文章页不再整体加载评论，而是按时间倒序分页查询（见 app.query_comment_page）
+    comments = db.relationship('Comment', backref='target_article', lazy='dynamic', cascade="all, delete-orphan")
+
+    # 首页信息流按 (update_time, id) 或 (trending_score, id) 游标分页；个人主页、面板按作者筛选后再按时间排序
+    __table_args__ = (
+        db.Index('ix_article_feed', 'is_draft', 'update_time', 'id'),
+        db.Index('ix_article_trending', 'is_draft', 'trending_score', 'id'),
+        db.Index('ix_article_user_feed', 'user_id', 'is_draft', 'update_time'),
+    )
+
+    def update_metrics(self, content=None):
+        """重新计算字数、阅读时间和摘录；content 为空时使用当前正文"""
+        content = self.content if content is None else content
+        self.word_count = count_words(content)
+        self.read_time = estimate_read_time(self.word_count)
+        self.excerpt = make_excerpt(content)
+
+
+# 正文修改时才重新统计，读取文章时不再做任何正则计算
+@event.listens_for(Article.content, 'set')
+def _on_content_set(target, value, oldvalue, initiator):
+    if value != oldvalue:
+        target.update_metrics(value or '')
+
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -108,4 +182,149 @@ class Comment(db.Model):
     # 这样可以用 article.comments 拿到所有评论
     author = db.relationship('User', backref=db.backref('comments', lazy=True))
 
+    # 文章页按时间倒序取评论
+    __table_args__ = (
+        db.Index('ix_comment_article_time', 'article_id', 'timestamp'),
+    )
+
+
+class TermCount(db.Model):
+    """用户分类/标签下已发布文章数的物化计数，供内容云图页直接读取"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'category' 或 'tag'
+    term_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_term_count_user', 'user_id', 'kind'),
+    )
+
+
+class ArticleSummary(db.Model):
+    """AI 生成的文章摘要，按正文哈希缓存，正文不变就不再重复请求"""
+    id = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
+    content_hash = db.Column(db.String(16), nullable=False)
+    summary = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.UniqueConstraint('article_id', 'content_hash', name='uq_summary_article_hash'),
+    )
+
+
+class ArticleRevision(db.Model):
+    """
+    草稿的历史版本，只存增量：delta 是把“更新一版的正文”还原成本版本正文的补丁（zlib 压缩）。
+    从文章当前正文开始按 version 倒序逐个应用即可还原任意保留的版本。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_revision_article_version', 'article_id', 'version'),
+    )
+
+
+class Blob(db.Model):
+    """按内容哈希存储的上传文件，相同内容只存一份"""
+    key = db.Column(db.String(80), primary_key=True)  # 形如 ab/abcdef....jpg
+    size = db.Column(db.Integer, nullable=False)
+    uploader_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.now)  # 重复上传时刷新，垃圾回收据此留出宽限期
+
+
+class BlobRef(db.Model):
+    """谁在使用某个上传文件：('article', 文章id) 或 ('user', 用户id)"""
+    id = db.Column(db.Integer, primary_key=True)
+    blob_key = db.Column(db.String(80), db.ForeignKey('blob.key'), nullable=False)
+    owner_type = db.Column(db.String(10), nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('blob_key', 'owner_type', 'owner_id', name='uq_blob_ref'),
+        db.Index('ix_blob_ref_owner', 'owner_type', 'owner_id'),
+    )
+
+
+class Job(db.Model):
+    """
+    后台任务队列（见 jobs.py）。key 是幂等键：同一个键同时只会有一个排队中的任务，
+    重复登记直接合并；任务开始执行后再登记会排一个新的，保证能看到最新的数据。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON，作为关键字参数传给任务函数
+    key = db.Column(db.String(200))
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued/running/done/failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.now)  # 重试时推迟到这个时间
+    locked_until = db.Column(db.DateTime)  # 执行中的租约，过期未完成（进程崩溃）会被重新领取
+    last_error = db.Column(db.Text)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # 谁触发的，状态接口据此鉴权
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+        db.Index('uq_job_queued_key', 'key', unique=True,
+                 sqlite_where=db.text("status = 'queued'"), postgresql_where=db.text("status = 'queued'")),
+    )
+
+
+class ArticleVector(db.Model):
+    """相关文章推荐用的词频（见 related.py），文章保存后在后台更新，增量计算时不必重新切词"""
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), primary_key=True)
+    terms = db.Column(db.Text, nullable=False)  # JSON：{词: 加权词频}
+
+
+class TermPosting(db.Model):
+    """相关文章的倒排表（见 related.py）：每篇公开文章的加权向量，每一维一行，增量更新时按词找出共享它的文章"""
+    term = db.Column(db.String(100), primary_key=True)  # 正文的词，或 '#标签名'
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), primary_key=True)
+    weight = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_term_posting_article', 'article_id'),
+    )
+
+
+class DocumentFrequency(db.Model):
+    """每个词出现在多少篇公开文章的 ArticleVector 里，增量更新时算 IDF 用，不必扫描全部词频"""
+    term = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+
+class RelatedArticle(db.Model):
+    """预先算好的相关文章，每篇保留得分最高的若干篇，文章页按 rank 直接读取"""
+    id = db.Column(db.Integer, primary_key=True)
+    article_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
+    related_id = db.Column(db.Integer, db.ForeignKey('article.id'), nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_related_article_rank', 'article_id', 'rank'),
+        db.Index('ix_related_related', 'related_id'),
+    )
+
+
+class Notification(db.Model):
+    """给作者的评论提醒，一段时间内的新评论合并成一条（见 notifications.py）"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    comment_count = db.Column(db.Integer, nullable=False)
+    article_ids = db.Column(db.Text, nullable=False)  # JSON：涉及的文章 id，评论最多的在前
+    last_comment_id = db.Column(db.Integer, nullable=False)  # 已经提醒到的评论，下次从它之后汇总
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
+    __table_args__ = (
+        db.Index('ix_notification_user', 'user_id', 'is_read', 'id'),
+    )
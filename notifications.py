@@ -0,0 +1,61 @@
+"""
+评论提醒。
+
+有人评论文章时不逐条通知作者，而是给作者登记一个延迟 COMMENT_NOTIFY_DELAY 秒执行的后台任务，
+幂等键是 notify:<作者id>，这段时间里作者收到的其它评论都合并进同一个任务。
+任务执行时把上次提醒之后的新评论（不含作者自己的）汇总成一条 Notification，
+一波评论再多也只写一行，个人面板显示未读的提醒。
+"""
+import json
+
+from jobs import job_queue
+from models import db, Article, Comment, Notification
+
+MAX_ARTICLES = 5  # 一条提醒里最多列出的文章数
+
+
+def queue_comment_notification(comment, article, delay):
+    """在发表评论的事务里登记提醒任务；作者评论自己的文章不提醒"""
+    if comment.user_id == article.user_id:
+        return None
+    return job_queue.enqueue('notifications.comments', {'user_id': article.user_id, 'since_id': comment.id},
+                             key=f'notify:{article.user_id}', delay=delay)
+
+
+def deliver_comment_notifications(user_id, since_id):
+    """
+    把 user_id 收到的新评论汇总成一条提醒并返回，没有新评论时返回 None。调用方负责提交。
+    since_id 是触发任务的第一条评论，用户还没有任何提醒时从它开始算，不会把历史评论都算进来。
+    """
+    last_id = db.session.query(db.func.max(Notification.last_comment_id)).filter_by(user_id=user_id).scalar()
+    after = last_id if last_id is not None else since_id - 1
+    rows = db.session.query(Comment.article_id, db.func.count(Comment.id), db.func.max(Comment.id)) \
+        .join(Article, Article.id == Comment.article_id) \
+        .filter(Article.user_id == user_id, Comment.user_id != user_id, Comment.id > after) \
+        .group_by(Comment.article_id).all()
+    if not rows:
+        return None
+    rows.sort(key=lambda row: (-row[1], -row[2]))
+    notification = Notification(
+        user_id=user_id,
+        comment_count=sum(row[1] for row in rows),
+        article_ids=json.dumps([row[0] for row in rows[:MAX_ARTICLES]]),
+        last_comment_id=max(row[2] for row in rows),
+    )
+    db.session.add(notification)
+    return notification
+
+
+def unread_notifications(user_id, limit=20):
+    """返回 [(提醒, [文章, ...])]，文章一次查出；已删除的文章不显示"""
+    notifications = Notification.query.filter_by(user_id=user_id, is_read=False) \
+        .order_by(Notification.id.desc()).limit(limit).all()
+    ids_of = {n.id: json.loads(n.article_ids) for n in notifications}
+    wanted = {article_id for ids in ids_of.values() for article_id in ids}
+    articles = {a.id: a for a in Article.query.filter(Article.id.in_(wanted))} if wanted else {}
+    return [(n, [articles[i] for i in ids_of[n.id] if i in articles]) for n in notifications]
+
+
+def mark_notifications_read(user_id):
+    return Notification.query.filter_by(user_id=user_id, is_read=False) \
+        .update({Notification.is_read: True}, synchronize_session=False)
@@ -0,0 +1,176 @@
+"""
+匿名访问的整页缓存。
+
+公开页面（首页、文章页、个人主页、分类/标签页、云图页）对未登录用户缓存渲染好的 HTML，
+命中时既不查数据库也不渲染模板，并带上 ETag / Last-Modified，浏览器可以拿到 304。
+
+失效按“依赖标签”进行：每个缓存页记录它依赖的标签（如 article:3、tag:7）及当时的版本号，
+数据变化时只把相关标签的版本号 +1，旧页面在下次读取时发现版本不一致即作废。
+版本号和页面存在同一个后端里：默认进程内 LRU；多进程部署时配置
+PAGE_CACHE_REDIS_URL 使用 Redis 共享，一个进程里的失效对所有进程生效。
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request, session
+from flask_login import current_user
+
+
+class MemoryBackend:
+    """进程内 LRU，带过期时间；标签版本号单独存放，不参与淘汰"""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+
+class RedisBackend:
+    """多进程共享的 Redis 后端，需要安装 redis 包"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def get_counters(self, keys):
+        return self.client.mget(keys) if keys else []
+
+    def incr(self, key):
+        self.client.incr(key)
+
+
+class PageCache:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 300
+        self.enabled = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        self.ttl = app.config.setdefault('PAGE_CACHE_TTL', 300)  # 兜底过期时间，防止漏掉的失效
+        redis_url = app.config.setdefault('PAGE_CACHE_REDIS_URL', None)
+        if redis_url:
+            self.backend = RedisBackend(redis_url)
+        else:
+            self.backend = MemoryBackend(app.config.setdefault('PAGE_CACHE_SIZE', 512))
+
+    # --- 标签版本 ---
+    def _tag_versions(self, tags):
+        values = self.backend.get_counters([f'tag:{t}' for t in tags])
+        return {t: int(v or 0) for t, v in zip(tags, values)}
+
+    def invalidate(self, *tags):
+        """数据变化后调用，作废依赖这些标签的所有页面"""
+        for tag in set(tags):
+            if tag:
+                self.backend.incr(f'tag:{tag}')
+
+    @staticmethod
+    def mark_modified(timestamp):
+        """视图里调用，记录页面内容的最后修改时间（取最大值），用作 Last-Modified"""
+        if timestamp and (g.get('page_last_modified') is None or timestamp > g.page_last_modified):
+            g.page_last_modified = timestamp
+
+    def _cacheable(self):
+        # 登录用户看到的页面带个人信息；有待显示的 flash 消息时页面也不通用
+        return (self.enabled and request.method == 'GET'
+                and not current_user.is_authenticated
+                and '_flashes' not in session)
+
+    def _load(self, key):
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        if self._tag_versions(list(entry['tags'])) != entry['tags']:
+            return None
+        return entry
+
+    @staticmethod
+    def _respond(entry):
+        response = make_response(entry['body'])
+        response.content_type = entry['content_type']
+        response.set_etag(entry['etag'])
+        if entry['last_modified']:
+            response.last_modified = entry['last_modified']
+        # 允许浏览器缓存，但每次都要用 ETag 回来确认
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def cached(self, tags):
+        """视图装饰器。tags 是一个函数，接收视图的路由参数，返回该页面依赖的标签列表"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._cacheable():
+                    return view(*args, **kwargs)
+
+                key = f'page:{request.full_path}'
+                entry = self._load(key)
+                if entry is not None:
+                    return self._respond(entry)
+
+                # 先取版本号再渲染：渲染期间发生的失效会让这份缓存在下次读取时直接作废
+                versions = self._tag_versions(list(tags(**kwargs)))
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or '_flashes' in session:
+                    return response
+
+                last_modified = g.get('page_last_modified')
+                body = response.get_data(as_text=True)
+                entry = {
+                    'body': body,
+                    'content_type': response.content_type,
+                    'etag': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+                    'last_modified': last_modified.timestamp() if last_modified else None,
+                    'tags': versions,
+                }
+                self.backend.set(key, json.dumps(entry), ttl=self.ttl)
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+
+page_cache = PageCache()
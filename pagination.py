@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from flask import abort
+from models import db
+
+# 游标中的时间格式：精确到微秒，避免同一秒内发布的文章被跳过
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_cursor(value, row_id):
+    """把 (排序值, id) 编码成 URL 友好的游标字符串；排序值是时间或数字"""
+    if isinstance(value, datetime):
+        return f"{value.strftime(CURSOR_TIME_FORMAT)}_{row_id}"
+    return f"{value!r}_{row_id}"
+
+
+def _parse_time(text):
+    return datetime.strptime(text, CURSOR_TIME_FORMAT)
+
+
+def decode_cursor(cursor, parse_value=_parse_time):
+    """解析游标，格式不对直接返回 400"""
+    if not cursor:
+        return None
+    try:
+        value_part, id_part = cursor.split('_', 1)
+        return parse_value(value_part), int(id_part)
+    except ValueError:
+        abort(400)
+
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=20):
+    """
+    按 (sort_column, id_column) 倒序做游标分页，sort_column 是时间列或数值列。
+    与 OFFSET 分页不同，翻到多深都只扫描一页的数据量。
+    返回 (本页数据, 下一页游标)；没有下一页时游标为 None。
+    """
+    parse_value = _parse_time if isinstance(sort_column.type, db.DateTime) else float
+    position = decode_cursor(cursor, parse_value)
+    if position:
+        last_value, last_id = position
+        query = query.filter(db.or_(
+            sort_column < last_value,
+            db.and_(sort_column == last_value, id_column < last_id)
+        ))
+
+    # 多取一条用来判断是否还有下一页
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return items, next_cursor
@@ -0,0 +1,117 @@
+"""
+限流和重复提交检测。
+
+- 令牌桶：每个键（如 comment:user:3）一个桶，容量 burst，每 interval 秒补一个令牌，
+  允许短时间内连发几次，持续刷屏则按固定速率放行；
+- 去重：写库前用 seen 检查，提交成功后再用 first_seen 记下，ttl 秒内的相同内容不再保存；
+  没有保存成功的请求（文章不存在、提交失败）不会留下记录，用户可以重试。
+都在写数据库之前判断，被拦下的请求不占用 SQLite 的写锁。
+状态默认存在进程内存里；多进程部署时配置 RATE_LIMIT_REDIS_URL，所有进程共享同一组计数。
+"""
+import math
+import threading
+import time
+
+
+class MemoryStore:
+    """进程内存储；键太多时清理已经回满的桶和过期的去重记录"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}  # 键 -> (剩余令牌, 更新时间, 回满时间)
+        self._seen = {}  # 键 -> 过期时间
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, interval):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) / interval)
+            wait = 0.0
+            if tokens < 1:
+                wait = (1 - tokens) * interval
+            else:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) * interval)
+            if len(self._buckets) > self.max_keys:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            return wait
+
+    def seen(self, key):
+        expires = self._seen.get(key)
+        return expires is not None and expires > time.monotonic()
+
+    def add(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            expires = self._seen.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._seen[key] = now + ttl
+            if len(self._seen) > self.max_keys:
+                self._seen = {k: v for k, v in self._seen.items() if v > now}
+            return True
+
+
+class RedisStore:
+    """多进程共享的 Redis 存储，需要安装 redis 包；令牌桶用 Lua 脚本保证原子性"""
+
+    TAKE_SCRIPT = """
+    local burst, interval, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = math.min(burst, (tonumber(state[1]) or burst) + (now - (tonumber(state[2]) or now)) / interval)
+    local wait = 0
+    if tokens < 1 then wait = (1 - tokens) * interval else tokens = tokens - 1 end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst * interval))
+    return tostring(wait)
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._take = self.client.register_script(self.TAKE_SCRIPT)
+
+    def take(self, key, burst, interval):
+        return float(self._take(keys=[f'ratelimit:{key}'], args=[burst, interval, time.time()]))
+
+    def seen(self, key):
+        return bool(self.client.exists(f'seen:{key}'))
+
+    def add(self, key, ttl):
+        return bool(self.client.set(f'seen:{key}', 1, nx=True, ex=max(1, math.ceil(ttl))))
+
+
+class RateLimiter:
+
+    def __init__(self, app=None):
+        self.store = None
+        self.enabled = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        redis_url = app.config.setdefault('RATE_LIMIT_REDIS_URL', None)
+        self.store = RedisStore(redis_url) if redis_url else MemoryStore()
+
+    def limit(self, keys, burst, interval):
+        """
+        每个键各取一个令牌，都取到才放行。返回需要等待的秒数（取整），0 表示放行。
+        某个键被拒绝时，其它键已经取走的令牌不退还。
+        """
+        if not self.enabled:
+            return 0
+        wait = max(self.store.take(key, burst, interval) for key in keys)
+        return math.ceil(wait)
+
+    def seen(self, key):
+        """这个键是否已经记下且没有过期；只检查，不记录"""
+        return self.enabled and self.store.seen(key)
+
+    def first_seen(self, key, ttl):
+        """记下这个键，ttl 秒内第一次见到时返回 True"""
+        return not self.enabled or self.store.add(key, ttl)
+
+
+rate_limiter = RateLimiter()
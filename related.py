@@ -0,0 +1,415 @@
+"""
+相关文章推荐。
+
+文章页的“相关阅读”只读 RelatedArticle 表里预先算好的前 RELATED_K 篇，一条带索引的查询，
+浏览时不做任何相似度计算。相似度由两部分加权：
+- 正文相似：标题、摘要、正文切词（与全文检索相同的 bigram 切分）后的 TF-IDF 余弦相似度，
+  出现在一半以上文章里的词不参与；
+- 标签相似：按标签名（不区分作者）计算，并用 article_tags 里的共现关系扩展：
+  文章带“Flask”时，经常和它一起出现的“Python”也获得一部分权重。
+两部分向量按权重拼在一起后做点积即为加权和。
+
+全量重建（`flask rebuild-related`）把全部向量放进内存：装了 numpy + scipy 时用稀疏矩阵分块相乘，
+否则退回到纯 Python 的倒排表累加，结果相同。重建时同时写下每个词的文档频率（DocumentFrequency）
+和全部向量的倒排表（TermPosting）。
+
+增量更新：文章保存后后台任务只重算这篇文章的词频，用持久化的文档频率算出它的向量，
+再从倒排表里取出和它有共同词的文章求得分，不加载全部文章、也不重建索引。
+相似度是对称的，它和其它文章的得分同时决定了哪些列表需要修正：新得分超过了对方的第 K 名，
+或者对方原来就列着它；只读取、修改这些列表。其它文章的向量保持保存时的 IDF，
+随语料缓慢漂移，可以定期全量重建。
+"""
+import heapq
+import json
+import math
+from collections import Counter
+
+from sqlalchemy import bindparam, insert
+from sqlalchemy.orm import undefer
+
+from lazy_imports import optional_import
+from models import db, Article, ArticleVector, DocumentFrequency, RelatedArticle, Tag, TermPosting, \
+    article_tags, insert_ignoring_conflicts, strip_markdown
+from search_index import tokenize
+
+RELATED_K = 10  # 每篇文章保存的相关文章数
+MAX_TERMS = 300  # 每篇文章只保留词频最高的这么多词
+MAX_TERM_LENGTH = 100  # 更长的串多半是哈希、base64 之类，不当作词
+TEXT_WEIGHT = 0.7
+TAG_WEIGHT = 0.3
+COOCCURRENCE_WEIGHT = 0.5  # 共现标签相对于文章自带标签的权重
+MAX_DF_RATIO = 0.5
+BLOCK_SIZE = 256  # 矩阵分块相乘时每块的行数
+CHUNK = 500  # IN 查询每次带的参数个数
+BULK_RATIO = 4  # 一次更新超过全部文章的 1/4（比如导入）时，直接全量重建更快
+
+
+def term_frequencies(article):
+    """加权词频：标题的词算 3 次，摘要 2 次，正文 1 次；单字和纯数字不要"""
+    counts = Counter()
+    for text, weight in ((article.title, 3), (article.summary, 2), (strip_markdown(article.content), 1)):
+        for token in tokenize(text):
+            if 1 < len(token) <= MAX_TERM_LENGTH and not token.isdigit():
+                counts[token] += weight
+    return dict(counts.most_common(MAX_TERMS))
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK):
+        yield items[start:start + CHUNK]
+
+
+# --- 向量 ---
+def text_vector(tf, df, n):
+    """tf: 词频，df: {词: 文档频率}，n: 文章总数；出现在一半以上文章里的词区分度太低，不参与"""
+    weights = {}
+    for term, f in tf.items():
+        count = df.get(term, 1)
+        if count <= max(2, n * MAX_DF_RATIO):
+            weights[term] = (1 + math.log(f)) * (math.log((n + 1) / (count + 1)) + 1)
+    return _normalize(weights)
+
+
+def cooccurrence(tags_of, names=None):
+    """
+    tags_of: {文章id: 小写标签名集合}，返回 {标签: [(一起出现的标签, P(它 | 标签)), ...]}；
+    names 不为空时只统计这些标签的。
+    """
+    tag_counts, pair_counts = Counter(), Counter()
+    for tags in tags_of.values():
+        tag_counts.update(tags)
+        pair_counts.update((a, b) for a in tags for b in tags if a != b and (names is None or a in names))
+    related_tags = {}
+    for (a, b), count in pair_counts.items():
+        related_tags.setdefault(a, []).append((b, count / tag_counts[a]))
+    return related_tags
+
+
+def tag_vector(tags, related_tags):
+    vector = Counter()
+    for tag in tags:
+        vector[tag] += 1
+        for other, p in related_tags.get(tag, ()):
+            vector[other] += COOCCURRENCE_WEIGHT * p
+    return _normalize(vector)
+
+
+def combine(text, tags):
+    """拼接后的点积 = TEXT_WEIGHT * 正文余弦 + TAG_WEIGHT * 标签余弦"""
+    vector = {term: w * math.sqrt(TEXT_WEIGHT) for term, w in text.items()}
+    vector.update({f'#{tag}': w * math.sqrt(TAG_WEIGHT) for tag, w in tags.items()})
+    return vector
+
+
+def _tags_of(query):
+    """query 为 (文章id, 标签名) 的查询，返回 {文章id: 小写标签名集合}"""
+    tags_of = {}
+    for article_id, name in query:
+        tags_of.setdefault(article_id, set()).add(name.lower())
+    return tags_of
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {term: w / norm for term, w in vector.items()} if norm else {}
+
+
+# --- 词频和文档频率 ---
+def _remove_vectors(article_ids):
+    """删掉这些文章的词频和倒排记录，文档频率相应减少"""
+    delta = Counter()
+    for chunk in _chunks(article_ids):
+        for (terms,) in db.session.query(ArticleVector.terms).filter(ArticleVector.article_id.in_(chunk)):
+            delta.subtract(json.loads(terms).keys())
+        ArticleVector.query.filter(ArticleVector.article_id.in_(chunk)).delete(synchronize_session=False)
+        TermPosting.query.filter(TermPosting.article_id.in_(chunk)).delete(synchronize_session=False)
+    return delta
+
+
+def _update_document_frequencies(delta):
+    """delta: {词: 增减的文章数}。在数据库里原子地加减，并发的任务不会互相覆盖"""
+    delta = {term: d for term, d in delta.items() if d}
+    table = DocumentFrequency.__table__
+    existing = set()
+    for chunk in _chunks(delta):
+        existing.update(row[0] for row in db.session.query(DocumentFrequency.term)
+                        .filter(DocumentFrequency.term.in_(chunk)))
+    if existing:
+        db.session.execute(table.update().where(table.c.term == bindparam('t'))
+                           .values(count=table.c.count + bindparam('d')),
+                           [{'t': term, 'd': delta[term]} for term in existing])
+        for chunk in _chunks(existing):
+            DocumentFrequency.query.filter(DocumentFrequency.term.in_(chunk), DocumentFrequency.count <= 0) \
+                .delete(synchronize_session=False)
+    new = [{'term': term, 'count': d} for term, d in delta.items() if term not in existing and d > 0]
+    for start in range(0, len(new), CHUNK):
+        insert_ignoring_conflicts(DocumentFrequency, new[start:start + CHUNK])
+
+
+def refresh_vectors(article_ids):
+    """
+    重算这些文章的词频并维护文档频率；不存在或不公开的文章删掉词频。
+    返回 {仍然公开的文章id: 词频}。调用方负责提交
+    """
+    delta = _remove_vectors(article_ids)
+    frequencies = {}
+    for chunk in _chunks(article_ids):
+        for article in Article.query.filter(Article.id.in_(chunk), Article.is_draft.is_(False)) \
+                .options(undefer(Article.content)):
+            frequencies[article.id] = term_frequencies(article)
+            delta.update(frequencies[article.id].keys())
+    db.session.add_all([ArticleVector(article_id=article_id, terms=json.dumps(tf, ensure_ascii=False))
+                        for article_id, tf in frequencies.items()])
+    _update_document_frequencies(delta)
+    db.session.flush()
+    return frequencies
+
+
+def _write_postings(vectors):
+    """vectors: {文章id: 向量}，写入倒排表；这些文章原来的记录由调用方先删掉"""
+    rows = [{'term': term, 'article_id': article_id, 'weight': weight}
+            for article_id, vector in vectors.items() for term, weight in vector.items()]
+    if rows:
+        db.session.execute(insert(TermPosting), rows)
+
+
+# --- 全量：内存里的索引 ---
+class SimilarityIndex:
+    """某一时刻全部公开文章的向量，提供按行求相似度"""
+
+    def __init__(self):
+        rows = db.session.query(ArticleVector.article_id, ArticleVector.terms) \
+            .join(Article, Article.id == ArticleVector.article_id) \
+            .filter(Article.is_draft.is_(False)).order_by(ArticleVector.article_id).all()
+        self.ids = [row[0] for row in rows]
+        self.position = {article_id: i for i, article_id in enumerate(self.ids)}
+        frequencies = [json.loads(row[1]) for row in rows]
+        df = Counter(term for tf in frequencies for term in tf)
+        tags_of = {article_id: tags for article_id, tags in _tags_of(
+            db.session.query(article_tags.c.article_id, Tag.name).join(Tag, Tag.id == article_tags.c.tag_id)).items()
+            if article_id in self.position}
+        related_tags = cooccurrence(tags_of)
+        self.vectors = [combine(text_vector(tf, df, len(rows)), tag_vector(tags_of.get(article_id, ()), related_tags))
+                        for article_id, tf in zip(self.ids, frequencies)]
+        # numpy 和 scipy 是可选依赖，用到时才导入
+        numpy, sparse = optional_import('numpy'), optional_import('scipy.sparse')
+        use_matrix = numpy is not None and sparse is not None
+        self._matrix = self._build_matrix(numpy, sparse) if use_matrix else None
+        self._postings = self._build_postings() if not use_matrix else None
+
+    def _build_matrix(self, numpy, sparse):
+        vocabulary = {}
+        indptr, indices, data = [0], [], []
+        for vector in self.vectors:
+            for term, weight in vector.items():
+                indices.append(vocabulary.setdefault(term, len(vocabulary)))
+                data.append(weight)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((numpy.array(data, dtype=numpy.float32), indices, indptr),
+                                 shape=(len(self.vectors), max(len(vocabulary), 1)))
+
+    def _build_postings(self):
+        postings = {}
+        for i, vector in enumerate(self.vectors):
+            for term, weight in vector.items():
+                postings.setdefault(term, []).append((i, weight))
+        return postings
+
+    def similarities(self, article_ids):
+        """逐篇产出 (文章id, {其它文章id: 得分})，只包含得分大于 0 的"""
+        rows = [self.position[a] for a in article_ids if a in self.position]
+        if self._matrix is not None:
+            for start in range(0, len(rows), BLOCK_SIZE):
+                block = rows[start:start + BLOCK_SIZE]
+                scores = (self._matrix[block] @ self._matrix.T).tocsr()
+                for i, row in enumerate(block):
+                    lo, hi = scores.indptr[i], scores.indptr[i + 1]
+                    yield self.ids[row], {self.ids[j]: float(s) for j, s in
+                                          zip(scores.indices[lo:hi], scores.data[lo:hi]) if j != row and s > 0}
+            return
+
+        for row in rows:
+            scores = {}
+            get = scores.get
+            for term, weight in self.vectors[row].items():
+                for j, other in self._postings[term]:
+                    scores[j] = get(j, 0.0) + weight * other
+            scores.pop(row, None)
+            yield self.ids[row], {self.ids[j]: s for j, s in scores.items() if s > 0}
+
+
+# --- 增量：持久化的倒排表 ---
+def _vectors(frequencies):
+    """用持久化的文档频率和标签共现，给 {文章id: 词频} 算出向量"""
+    n = db.session.query(db.func.count(ArticleVector.article_id)).scalar()
+    df = {}
+    for chunk in _chunks({term for tf in frequencies.values() for term in tf}):
+        df.update(db.session.query(DocumentFrequency.term, DocumentFrequency.count)
+                  .filter(DocumentFrequency.term.in_(chunk)))
+    tags_of = {}
+    for chunk in _chunks(frequencies):
+        tags_of.update(_tags_of(db.session.query(article_tags.c.article_id, Tag.name)
+                                .join(Tag, Tag.id == article_tags.c.tag_id)
+                                .filter(article_tags.c.article_id.in_(chunk))))
+    names = set().union(*tags_of.values())
+    related_tags = {}
+    if names:
+        # 共现只需要带着这些标签的公开文章
+        sharing = db.session.query(article_tags.c.article_id).join(Tag, Tag.id == article_tags.c.tag_id) \
+            .filter(db.func.lower(Tag.name).in_(names))
+        related_tags = cooccurrence(_tags_of(
+            db.session.query(article_tags.c.article_id, Tag.name).join(Tag, Tag.id == article_tags.c.tag_id)
+            .join(ArticleVector, ArticleVector.article_id == article_tags.c.article_id)
+            .filter(article_tags.c.article_id.in_(sharing))), names)
+    return {article_id: combine(text_vector(tf, df, n), tag_vector(tags_of.get(article_id, ()), related_tags))
+            for article_id, tf in frequencies.items()}
+
+
+def _scores(article_id, vector):
+    """用倒排表求 vector 和其它公开文章的点积，只包含得分大于 0 的"""
+    scores = {}
+    get = scores.get
+    for chunk in _chunks(vector):
+        for term, other, weight in db.session.query(TermPosting.term, TermPosting.article_id, TermPosting.weight) \
+                .filter(TermPosting.term.in_(chunk)):
+            scores[other] = get(other, 0.0) + vector[term] * weight
+    scores.pop(article_id, None)
+    return {other: s for other, s in scores.items() if s > 0}
+
+
+def _stored_scores(article_id):
+    """已经在倒排表里的文章和其它文章的得分"""
+    vector = dict(db.session.query(TermPosting.term, TermPosting.weight).filter(TermPosting.article_id == article_id))
+    return _scores(article_id, vector)
+
+
+def _load_lists(query):
+    lists = {}
+    for row in query.order_by(RelatedArticle.article_id, RelatedArticle.rank):
+        lists.setdefault(row.article_id, []).append((row.related_id, row.score))
+    return lists
+
+
+def _top(scores, k=RELATED_K):
+    return [(article_id, round(score, 6)) for article_id, score in
+            heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def _save(neighbours):
+    """neighbours: {文章id: [(相关文章id, 得分), ...]}，整体替换这些文章的列表"""
+    if not neighbours:
+        return
+    for chunk in _chunks(neighbours):
+        RelatedArticle.query.filter(RelatedArticle.article_id.in_(chunk)).delete(synchronize_session=False)
+    rows = [{'article_id': article_id, 'related_id': related_id, 'rank': rank, 'score': score}
+            for article_id, items in neighbours.items() for rank, (related_id, score) in enumerate(items)]
+    if rows:
+        db.session.execute(insert(RelatedArticle), rows)
+
+
+def _rebuild():
+    """全量重建，不提交；返回 {文章id: 相关文章列表}"""
+    ArticleVector.query.delete()
+    DocumentFrequency.query.delete()
+    TermPosting.query.delete()
+    RelatedArticle.query.delete()
+    ids = [row[0] for row in db.session.query(Article.id).filter(Article.is_draft.is_(False))]
+    for chunk in _chunks(ids):
+        refresh_vectors(chunk)
+    index = SimilarityIndex()
+    _write_postings(dict(zip(index.ids, index.vectors)))
+    neighbours = {article_id: _top(scores) for article_id, scores in index.similarities(index.ids)}
+    _save(neighbours)
+    return neighbours
+
+
+def rebuild_related():
+    """全量重建：重算全部公开文章的词频、文档频率、倒排表和相关文章，返回处理的文章数"""
+    count = len(_rebuild())
+    db.session.commit()
+    return count
+
+
+def update_related(article_ids):
+    """
+    文章新建、编辑、删除后调用：重算它们的词频和近邻，并修正受影响的其它文章的列表。
+    返回列表有变化的文章 id（它们的页面缓存需要作废）。调用方负责提交。
+    """
+    article_ids = set(article_ids)
+    total = db.session.query(db.func.count(ArticleVector.article_id)).scalar()
+    if len(article_ids) * BULK_RATIO > max(total, RELATED_K):
+        before = _load_lists(RelatedArticle.query)
+        after = _rebuild()
+        return [a for a in set(before) | set(after)
+                if [r for r, _ in before.get(a, [])] != [r for r, _ in after.get(a, [])]]
+
+    vectors = _vectors(refresh_vectors(article_ids))
+    _write_postings(vectors)
+
+    # 只读取可能变化的列表：这些文章自己的，和原来列着它们的
+    owners = set(article_ids)
+    for chunk in _chunks(article_ids):
+        owners.update(row[0] for row in db.session.query(RelatedArticle.article_id)
+                      .filter(RelatedArticle.related_id.in_(chunk)))
+    current = {}
+    for chunk in _chunks(owners):
+        current.update(_load_lists(RelatedArticle.query.filter(RelatedArticle.article_id.in_(chunk))))
+    neighbours = {article_id: [] for article_id in article_ids if article_id in current}  # 已删除/转为草稿的清空
+    incoming = {}  # {其它文章id: {变化的文章id: 新得分}}
+    for article_id, vector in vectors.items():
+        scores = _scores(article_id, vector)
+        neighbours[article_id] = _top(scores)
+        for other, score in scores.items():
+            incoming.setdefault(other, {})[article_id] = score
+
+    # 新得分超过对方第 K 名（对方不足 K 篇时一定能进）的列表也要修正，只查这些文章的第 K 名
+    candidates = set(incoming) - article_ids - set(current)
+    kth = {}
+    for chunk in _chunks(candidates):
+        kth.update(db.session.query(RelatedArticle.article_id, RelatedArticle.score)
+                   .filter(RelatedArticle.article_id.in_(chunk), RelatedArticle.rank == RELATED_K - 1))
+    entering = [j for j in candidates if j not in kth or max(incoming[j].values()) > kth[j]]
+    for chunk in _chunks(entering):
+        current.update(_load_lists(RelatedArticle.query.filter(RelatedArticle.article_id.in_(chunk))))
+
+    for j in (set(current) | set(entering)) - article_ids:
+        items = current.get(j, [])
+        merged = dict((r, s) for r, s in items if r not in article_ids)
+        merged.update(incoming.get(j, {}))
+        top = _top(merged)
+        # 原来的列表是满的，没列进去的文章得分都不高于它的第 K 名；合并后的第 K 名比它低时，
+        # 可能有列表外的文章该补进来，只有这种情况才需要对这篇文章重新求全部得分
+        if len(items) >= RELATED_K and (len(top) < RELATED_K or top[-1][1] < items[-1][1]):
+            top = _top(_stored_scores(j))
+        neighbours[j] = top
+
+    _save({a: items for a, items in neighbours.items() if items != current.get(a, [])})
+    return [a for a, items in neighbours.items() if [r for r, _ in items] != [r for r, _ in current.get(a, [])]]
+
+
+def forget_article(article_id):
+    """删除文章前调用：删掉它的词频、倒排和相关文章记录，返回列表里有它、需要重新计算的文章 id"""
+    affected = [row[0] for row in db.session.query(RelatedArticle.article_id).filter_by(related_id=article_id)]
+    RelatedArticle.query.filter(db.or_(RelatedArticle.article_id == article_id,
+                                       RelatedArticle.related_id == article_id)).delete(synchronize_session=False)
+    _update_document_frequencies(_remove_vectors([article_id]))
+    return affected
+
+
+def backfill_related_index():
+    """
+    有已发布文章还没有词频时（旧库升级上来，或者漏跑了任务）全量重建一次，返回处理的文章数。
+    增量更新只在保存文章时触发，不补建的话旧文章永远没有相关阅读
+    """
+    published = db.session.query(db.func.count(Article.id)).filter(Article.is_draft.is_(False)).scalar()
+    if published <= db.session.query(db.func.count(ArticleVector.article_id)).scalar():
+        return 0
+    return rebuild_related()
+
+
+def related_articles(article_id, limit=5):
+    """文章页用：按预先算好的顺序取相关的已发布文章，一条查询"""
+    return Article.query.join(RelatedArticle, RelatedArticle.related_id == Article.id) \
+        .filter(RelatedArticle.article_id == article_id, Article.is_draft.is_(False)) \
+        .order_by(RelatedArticle.rank).limit(limit).all()
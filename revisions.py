@@ -0,0 +1,179 @@
+"""
+草稿自动保存与修订历史。
+
+编辑器每隔几秒只把“与上次保存相比的改动”发给服务器，而不是整篇重新提交表单：
+补丁是 [[start, end, text], ...]，表示把 [start, end) 替换成 text，
+下标按 UTF-16 码元计算（与浏览器里 JavaScript 字符串下标一致），互不重叠。
+请求带上编辑器所基于的版本号，用条件 UPDATE 写入，版本号对不上说明别的页面/设备
+已经保存过，由调用方返回 409 让编辑器重新同步。
+
+每次正文变化同时记一条反向增量（ArticleRevision），AUTOSAVE_REVISION_INTERVAL 秒内的
+连续保存合并成一条，每篇文章最多保留 AUTOSAVE_MAX_REVISIONS 条。
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+from models import db, Article, ArticleRevision, count_words, estimate_read_time, make_excerpt
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _utf16(text):
+    # surrogatepass：补丁可能恰好把一个 emoji 的代理对拆在两边，拼回去后再整体校验
+    return (text or '').encode('utf-16-le', 'surrogatepass')
+
+
+def utf16_length(text):
+    return len(_utf16(text)) // 2
+
+
+def apply_patches(content, patches):
+    """按 UTF-16 下标把补丁应用到正文上，返回新正文；补丁不合法时抛出 PatchError"""
+    try:
+        ops = sorted(((int(start), int(end), str(text)) for start, end, text in patches), reverse=True)
+    except (TypeError, ValueError):
+        raise PatchError('补丁格式错误')
+
+    data = _utf16(content)
+    bound = len(data) // 2
+    # 从后往前应用，前面的下标不受影响
+    for start, end, text in ops:
+        if not 0 <= start <= end <= bound:
+            raise PatchError('补丁位置越界或互相重叠')
+        data = data[:start * 2] + _utf16(text) + data[end * 2:]
+        bound = start
+    try:
+        return data.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise PatchError('补丁应用后不是合法文本')
+
+
+def _common_prefix(a, b):
+    # 二分比较切片，比逐字符循环快得多
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def diff_splice(old, new):
+    """求把 old 变成 new 的单个替换 (start, end, text)，下标为 Python 字符下标"""
+    prefix = _common_prefix(old, new)
+    suffix = _common_suffix(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - suffix, new[prefix:len(new) - suffix]
+
+
+def encode_delta(old, new):
+    return zlib.compress(json.dumps(diff_splice(old, new), ensure_ascii=False).encode('utf-8'))
+
+
+def apply_delta(content, delta):
+    start, end, text = json.loads(zlib.decompress(delta))
+    return content[:start] + text + content[end:]
+
+
+def record_revision(article_id, old_version, old_content, new_content):
+    """正文从 old_content 改成 new_content 后调用，记录可以还原 old_content 的反向增量"""
+    config = current_app.config
+    latest = ArticleRevision.query.filter_by(article_id=article_id) \
+        .order_by(ArticleRevision.version.desc()).first()
+    if latest and latest.created_at > datetime.now() - timedelta(seconds=config['AUTOSAVE_REVISION_INTERVAL']):
+        # 与上一条合并：它原本从 old_content 还原，现在改成直接从 new_content 还原
+        target = apply_delta(old_content, latest.delta)
+        latest.delta = encode_delta(new_content, target)
+        return
+
+    db.session.add(ArticleRevision(article_id=article_id, version=old_version,
+                                   delta=encode_delta(new_content, old_content)))
+    db.session.flush()
+    stale_ids = [row[0] for row in db.session.query(ArticleRevision.id)
+                 .filter_by(article_id=article_id)
+                 .order_by(ArticleRevision.version.desc())
+                 .offset(config['AUTOSAVE_MAX_REVISIONS'])]
+    if stale_ids:
+        ArticleRevision.query.filter(ArticleRevision.id.in_(stale_ids)).delete(synchronize_session=False)
+
+
+def autosave(article, base_version, patches, expected_length=None, title=None, summary=None):
+    """
+    把补丁应用到文章上（调用方负责提交），返回新的版本号，article 上的字段会同步成新值；
+    版本号不一致时返回 None。补丁不合法或应用后长度与编辑器不一致时抛出 PatchError
+    """
+    current_version = article.version or 0
+    if base_version != current_version:
+        return None
+
+    old_content = article.content or ''
+    new_content = apply_patches(old_content, patches or [])
+    if expected_length is not None and utf16_length(new_content) != expected_length:
+        raise PatchError('补丁应用后长度不一致')
+
+    values = {}
+    if new_content != old_content:
+        word_count = count_words(new_content)
+        values.update({Article.content: new_content, Article.word_count: word_count,
+                       Article.read_time: estimate_read_time(word_count), Article.excerpt: make_excerpt(new_content)})
+    if title is not None and title != article.title:
+        values[Article.title] = title[:100] or '未命名草稿'
+    if summary is not None and summary != article.summary:
+        values[Article.summary] = summary
+    if not values:
+        return current_version
+
+    # 条件 UPDATE：只有版本号仍是编辑器看到的那一版才写入，并发保存只会成功一个
+    values[Article.version] = current_version + 1
+    updated = Article.query.filter(Article.id == article.id,
+                                   db.func.coalesce(Article.version, 0) == current_version) \
+        .update(values, synchronize_session='fetch')
+    if not updated:
+        db.session.rollback()
+        return None
+
+    if new_content != old_content:
+        record_revision(article.id, current_version, old_content, new_content)
+    return current_version + 1
+
+
+def note_full_save(article, old_content):
+    """编辑页整篇提交后调用：正文有变化时递增版本号并记一条修订，调用方负责提交"""
+    if (article.content or '') == (old_content or ''):
+        return
+    old_version = article.version or 0
+    record_revision(article.id, old_version, old_content or '', article.content or '')
+    article.version = old_version + 1
+
+
+def list_revisions(article_id):
+    return ArticleRevision.query.filter_by(article_id=article_id) \
+        .order_by(ArticleRevision.version.desc()).all()
+
+
+def load_revision(article, version):
+    """从当前正文倒推出指定版本的正文；该版本没有保留时返回 None"""
+    content = article.content or ''
+    for revision in ArticleRevision.query.filter(ArticleRevision.article_id == article.id,
+                                                 ArticleRevision.version >= version) \
+            .order_by(ArticleRevision.version.desc()):
+        content = apply_delta(content, revision.delta)
+        if revision.version == version:
+            return content
+    return None
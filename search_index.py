@@ -0,0 +1,186 @@
+"""
+文章全文检索：基于 SQLite FTS5。
+
+FTS5 自带的 unicode61 分词器会把一整段中文当成一个词，搜不到中间的词语，
+所以入库前先自己切词：中文按相邻两字切成二元组（bigram），英文/数字按单词，
+查询串做同样的切分，这样 “数据库” 可以命中 “分布式数据库设计”。
+片段高亮在 Python 里基于原文生成，因为索引里存的是切分后的文本。
+"""
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import selectinload, undefer
+from models import db, Article
+
+FTS_TABLE = 'article_fts'
+
+# 中日韩文字（含扩展 A 区与日文假名）
+CJK_CHARS = '぀-ヿ㐀-䶿一-鿿가-힯'
+CJK_RE = re.compile(f'[{CJK_CHARS}]+')
+WORD_RE = re.compile(f'[{CJK_CHARS}]+|[^\\W{CJK_CHARS}]+')
+
+
+def search_enabled():
+    """FTS5 只在 SQLite 下可用，其它数据库退回 LIKE 查询"""
+    return db.engine.dialect.name == 'sqlite'
+
+
+def tokenize(raw):
+    """把文本切成空格分隔的词，中文切成 bigram"""
+    tokens = []
+    for word in WORD_RE.findall((raw or '').lower()):
+        if CJK_RE.fullmatch(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def build_match_query(query):
+    """生成 FTS5 MATCH 表达式：所有词都要出现，单个汉字按前缀匹配"""
+    parts = []
+    for token in tokenize(query):
+        if len(token) == 1 and CJK_RE.fullmatch(token):
+            parts.append(f'"{token}"*')
+        else:
+            parts.append(f'"{token}"')
+    return ' '.join(parts)
+
+
+def ensure_search_index():
+    """
+    创建 FTS5 虚表（rowid 即文章 id）。表是这次新建的，就把已有的文章都写进去，返回写入的文章数；
+    表已经存在时什么都不做，返回 None。由 upgrade_database() 调用。
+    """
+    if not search_enabled() or inspect(db.engine).has_table(FTS_TABLE):
+        return None
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, summary, content, tokenize='unicode61 remove_diacritics 2')"
+    ))
+    return _index_all()
+
+
+def index_article(article):
+    """文章新建/编辑后调用；草稿不进索引。与文章保存在同一个事务里"""
+    if not search_enabled():
+        return
+    remove_article(article.id)
+    if article.is_draft:
+        return
+    db.session.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, title, summary, content) VALUES (:id, :title, :summary, :content)"),
+        {
+            'id': article.id,
+            'title': ' '.join(tokenize(article.title)),
+            'summary': ' '.join(tokenize(article.summary)),
+            'content': ' '.join(tokenize(article.content)),
+        }
+    )
+
+
+def remove_article(article_id):
+    if not search_enabled():
+        return
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': article_id})
+
+
+def rebuild_search_index():
+    """清空并重建整个索引，返回写入的文章数"""
+    if not search_enabled():
+        return 0
+    created = ensure_search_index()
+    if created is not None:
+        return created
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    return _index_all()
+
+
+def _index_all():
+    count = 0
+    for article in Article.query.filter_by(is_draft=False).options(undefer(Article.content)).yield_per(200):
+        index_article(article)
+        count += 1
+    db.session.commit()
+    return count
+
+
+def search_articles(query, page=1, per_page=10):
+    """
+    按 BM25 相关度排序的分页检索。
+    返回 (本页文章列表, 命中总数, {文章id: 高亮片段})
+    """
+    match = build_match_query(query)
+    if not match:
+        return [], 0, {}
+
+    offset = (page - 1) * per_page
+    if search_enabled():
+        # 标题权重最高，其次摘要，最后正文
+        rows = db.session.execute(text(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 4.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), {'q': match, 'limit': per_page, 'offset': offset}).scalars().all()
+        total = db.session.execute(
+            text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"), {'q': match}
+        ).scalar()
+    else:
+        like = db.or_(Article.title.contains(query), Article.summary.contains(query),
+                      Article.content.contains(query))
+        base = Article.query.filter(like, Article.is_draft == False)
+        total = base.count()
+        rows = [a.id for a in base.order_by(Article.update_time.desc()).offset(offset).limit(per_page)]
+
+    # 片段要从正文里截取，这里一次性带上正文
+    articles = Article.query.filter(Article.id.in_(rows)).options(
+        selectinload(Article.author), undefer(Article.content)).all()
+    by_id = {a.id: a for a in articles}
+    # 保持相关度顺序；索引与文章表短暂不一致时跳过缺失的 id
+    ordered = [by_id[i] for i in rows if i in by_id]
+    snippets = {a.id: make_snippet(a, query) for a in ordered}
+    return ordered, total, snippets
+
+
+def plain_text(markdown):
+    """粗略去掉 Markdown 标记，用于生成片段"""
+    s = re.sub(r'!\[.*?\]\(.*?\)', '', markdown or '')
+    s = re.sub(r'\[(.*?)\]\(.*?\)', r'\1', s)
+    s = re.sub(r'<[^>]*>', '', s)
+    s = re.sub(r'[#*_>`~|-]+', ' ', s)
+    return ' '.join(s.split())
+
+
+def make_snippet(article, query, width=60):
+    """在摘要/正文里找到第一个命中位置，截取前后文并用 <mark> 高亮"""
+    terms = [t for t in query.lower().split() if t]
+    # 原词找不到时退回到 bigram，例如 “数据库优化” 在正文里可能被拆开出现
+    terms += [t for t in tokenize(query) if t not in terms]
+    source = plain_text(article.summary) + ' ' + plain_text(article.content)
+    lowered = source.lower()
+
+    pos = -1
+    for term in terms:
+        pos = lowered.find(term)
+        if pos != -1:
+            break
+    if pos == -1:
+        return Markup(escape(source[:width * 2]))
+
+    start = max(0, pos - width)
+    end = min(len(source), pos + width)
+    fragment = source[start:end]
+    pattern = re.compile('|'.join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+
+    out, last = [], 0
+    for m in pattern.finditer(fragment):
+        out.append(escape(fragment[last:m.start()]))
+        out.append(Markup('<mark>') + escape(m.group(0)) + Markup('</mark>'))
+        last = m.end()
+    out.append(escape(fragment[last:]))
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if end < len(source) else ''
+    return Markup(prefix) + Markup('').join(out) + Markup(suffix)
@@ -0,0 +1,233 @@
+"""
+把公开页面导出成静态 HTML，供 nginx 直接返回。
+
+导出首页（第一页）、每篇已发布文章、每个用户的主页，以及有文章的分类/标签页，
+外加 sitemap.xml 和 Atom 格式的 feed.xml。地址 /article/3 写到 <输出目录>/article/3/index.html，
+nginx 对未登录用户（没有 session Cookie）按 try_files $uri/index.html 查找，找不到再交给 Flask。
+
+增量导出：每个页面根据它依赖的数据（文章的 update_time 和评论数、作者资料、分类/标签名、
+相关阅读，以及列表里每篇文章的这些信息）算一个指纹，和上次导出时记在 .export-manifest.json
+里的指纹比较，只重新渲染有变化的页面；模板文件变化时全部重新渲染。不再公开的页面（删除、改回草稿）会被删掉。
+渲染通过测试客户端以匿名身份请求真实路由，和线上看到的完全一致，多个页面分给进程池并行渲染。
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+from models import db, User, Article, Category, Tag, Comment, RelatedArticle, article_tags
+
+MANIFEST_NAME = '.export-manifest.json'
+FEED_SIZE = 20  # feed.xml 里的文章数
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+_app = None  # 正在导出的应用，fork 出来的渲染进程直接沿用
+_client = None  # 渲染进程里的测试客户端
+
+
+def fingerprint(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def templates_fingerprint(app):
+    """模板目录下所有文件内容的指纹，模板改了要全部重新渲染"""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(app.jinja_loader.searchpath[0]):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.html'):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(name.encode('utf-8') + f.read())
+    return digest.hexdigest()[:16]
+
+
+def collect_pages(feed_size, related_size):
+    """
+    返回 ({地址: 指纹}, 已发布文章列表)。只用几条批量查询，不加载正文。
+    feed_size 是首页第一页的文章数，related_size 是文章页“相关阅读”的条数。
+    """
+    users = {u.id: u for u in User.query}
+    author_fp = {uid: (u.username, u.nickname, u.avatar_url) for uid, u in users.items()}
+    category_names = {c.id: c.name for c in Category.query}
+    tag_names = {t.id: t.name for t in Tag.query}
+
+    articles = Article.query.filter_by(is_draft=False) \
+        .order_by(Article.update_time.desc(), Article.id.desc()).all()
+    published = {a.id for a in articles}
+    tags_of, commenters_of = {}, {}
+    for article_id, tag_id in db.session.query(article_tags.c.article_id, article_tags.c.tag_id):
+        if article_id in published:
+            tags_of.setdefault(article_id, []).append(tag_id)
+    for article_id, user_id in db.session.query(Comment.article_id, Comment.user_id).distinct():
+        if article_id in published:
+            commenters_of.setdefault(article_id, set()).add(user_id)
+    related_of = {}
+    for article_id, related_id in db.session.query(RelatedArticle.article_id, RelatedArticle.related_id) \
+            .order_by(RelatedArticle.article_id, RelatedArticle.rank):
+        if related_id in published:
+            related_of.setdefault(article_id, []).append(related_id)
+
+    # 列表里的一张卡片依赖的数据
+    card_fp = {a.id: (a.id, a.update_time, a.comment_count, author_fp.get(a.user_id),
+                      category_names.get(a.category_id), sorted(tag_names[t] for t in tags_of.get(a.id, [])))
+               for a in articles}
+
+    pages = {'/': fingerprint([card_fp[a.id] for a in articles[:feed_size]])}
+    by_user, by_category, by_tag = {}, {}, {}
+    for a in articles:
+        related = [(r, card_fp[r][1]) for r in related_of.get(a.id, [])[:related_size]]
+        pages[f'/article/{a.id}'] = fingerprint(
+            card_fp[a.id], sorted(author_fp.get(uid) for uid in commenters_of.get(a.id, ())), related)
+        by_user.setdefault(a.user_id, []).append(card_fp[a.id])
+        if a.category_id:
+            by_category.setdefault((a.user_id, a.category_id), []).append(card_fp[a.id])
+        for tag_id in tags_of.get(a.id, []):
+            by_tag.setdefault((a.user_id, tag_id), []).append(card_fp[a.id])
+
+    category_counts = dict(db.session.query(Category.user_id, db.func.count(Category.id)).group_by(Category.user_id))
+    tag_counts = dict(db.session.query(Tag.user_id, db.func.count(Tag.id)).group_by(Tag.user_id))
+    for uid, u in users.items():
+        profile = (u.username, u.nickname, u.gender, u.repo_link, u.bio, u.avatar_url, u.last_login)
+        pages[f'/user/{uid}'] = fingerprint(profile, category_counts.get(uid, 0), tag_counts.get(uid, 0),
+                                            by_user.get(uid, []))
+    for (uid, cid), cards in by_category.items():
+        pages[f'/user/{uid}/category/{cid}'] = fingerprint(author_fp[uid], category_names[cid], cards)
+    for (uid, tid), cards in by_tag.items():
+        pages[f'/user/{uid}/tag/{tid}'] = fingerprint(author_fp[uid], tag_names[tid], cards)
+    return pages, articles
+
+
+def output_path(output_dir, url):
+    return os.path.join(output_dir, url.strip('/'), 'index.html')
+
+
+def write_file(path, data):
+    """先写临时文件再改名，nginx 不会读到写了一半的页面"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _init_worker():
+    global _client
+    from page_cache import page_cache
+    from view_counter import view_counter
+    app = _app
+    if app is None:  # 不是 fork 出来的（spawn 启动方式），重新建一个应用
+        from app import create_app
+        app = create_app()
+    page_cache.enabled = False  # 每页只渲染一次，缓存没有意义
+    view_counter.enabled = False  # 导出不是真实浏览
+    app.config['JOBS_RUN_IN_PROCESS'] = False
+    # fork 出来的进程不能沿用父进程的数据库连接，create_app 登记的 fork 钩子已经处理
+    _client = app.test_client()
+
+
+def _render_pages(output_dir, urls):
+    """在渲染进程里执行：渲染一批页面并写盘，返回渲染失败的 [(地址, 状态码)]"""
+    failed = []
+    for url in urls:
+        response = _client.get(url)
+        if response.status_code != 200:
+            failed.append((url, response.status_code))
+            continue
+        write_file(output_path(output_dir, url), response.get_data())
+    return failed
+
+
+def build_sitemap(base_url, pages, articles):
+    lastmod = {f'/article/{a.id}': a.update_time for a in articles}
+    urlset = ElementTree.Element('urlset', xmlns=SITEMAP_NS)
+    for url in sorted(pages):
+        node = ElementTree.SubElement(urlset, 'url')
+        ElementTree.SubElement(node, 'loc').text = base_url + url
+        if url in lastmod:
+            ElementTree.SubElement(node, 'lastmod').text = lastmod[url].date().isoformat()
+    return ElementTree.tostring(urlset, encoding='utf-8', xml_declaration=True)
+
+
+def build_feed(base_url, title, articles):
+    feed = ElementTree.Element('feed', xmlns=ATOM_NS)
+    ElementTree.SubElement(feed, 'title').text = title
+    ElementTree.SubElement(feed, 'id').text = base_url + '/'
+    ElementTree.SubElement(feed, 'link', href=base_url + '/')
+    ElementTree.SubElement(feed, 'link', rel='self', href=base_url + '/feed.xml')
+    if articles:
+        ElementTree.SubElement(feed, 'updated').text = articles[0].update_time.isoformat(timespec='seconds')
+    for a in articles[:FEED_SIZE]:
+        url = f'{base_url}/article/{a.id}'
+        entry = ElementTree.SubElement(feed, 'entry')
+        ElementTree.SubElement(entry, 'title').text = a.title
+        ElementTree.SubElement(entry, 'id').text = url
+        ElementTree.SubElement(entry, 'link', href=url)
+        ElementTree.SubElement(entry, 'updated').text = a.update_time.isoformat(timespec='seconds')
+        author = ElementTree.SubElement(entry, 'author')
+        ElementTree.SubElement(author, 'name').text = a.author.nickname or a.author.username
+        ElementTree.SubElement(entry, 'summary').text = a.summary or a.excerpt or ''
+    return ElementTree.tostring(feed, encoding='utf-8', xml_declaration=True)
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_site(app, output_dir, base_url, workers=None, force=False):
+    """
+    增量导出，返回 {'rendered': 重新渲染数, 'unchanged': 未变化数, 'removed': 删除数, 'failed': [(地址, 状态码)]}。
+    workers 为 1 时在当前进程里渲染。
+    """
+    base_url = base_url.rstrip('/')
+    manifest = {} if force else load_manifest(output_dir)
+    template_fp = templates_fingerprint(app)
+    old_pages = manifest.get('pages', {}) if manifest.get('templates') == template_fp else {}
+
+    pages, articles = collect_pages(app.config['FEED_PER_PAGE'], app.config['RELATED_PER_PAGE'])
+    stale = [url for url, fp in pages.items() if old_pages.get(url) != fp]
+    removed = [url for url in manifest.get('pages', {}) if url not in pages]
+
+    global _app, _client
+    failed = []
+    workers = workers or os.cpu_count() or 1
+    _app = app
+    if stale and workers > 1:
+        chunks = [stale[i::workers * 4] for i in range(min(len(stale), workers * 4))]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for result in pool.map(_render_pages, [output_dir] * len(chunks), chunks):
+                failed += result
+    elif stale:
+        # 和渲染进程一样关掉页面缓存和浏览计数，结束后恢复原来的设置
+        from page_cache import page_cache
+        from view_counter import view_counter
+        saved = page_cache.enabled, view_counter.enabled
+        _client = app.test_client()
+        page_cache.enabled = view_counter.enabled = False
+        try:
+            failed = _render_pages(output_dir, stale)
+        finally:
+            page_cache.enabled, view_counter.enabled = saved
+
+    for url in removed:
+        try:
+            os.remove(output_path(output_dir, url))
+        except OSError:
+            pass
+
+    write_file(os.path.join(output_dir, 'sitemap.xml'), build_sitemap(base_url, pages, articles))
+    write_file(os.path.join(output_dir, 'feed.xml'), build_feed(base_url, app.config['SITE_NAME'], articles))
+
+    # 渲染失败的页面不记指纹，下次还会重试
+    failed_urls = {url for url, _ in failed}
+    write_file(os.path.join(output_dir, MANIFEST_NAME), json.dumps({
+        'templates': template_fp,
+        'pages': {url: fp for url, fp in pages.items() if url not in failed_urls},
+    }, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return {'rendered': len(stale) - len(failed), 'unchanged': len(pages) - len(stale),
+            'removed': len(removed), 'failed': failed}
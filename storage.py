@@ -0,0 +1,181 @@
+"""
+上传文件存储：按 SHA-256 内容寻址，自动去重。
+
+- 上传流按块写入临时文件，同时计算哈希，不会把整个文件读进内存；
+- 相同内容只保存一份（Blob 表），谁在用由 BlobRef 表记录，
+  文章删除、封面/头像替换后没人引用的文件由 collect_garbage 清理；
+- 实际读写交给可替换的后端，UPLOAD_STORAGE_BACKEND 配置类的导入路径，
+  默认是本地目录 LocalStorage；换成 S3 兼容存储时实现同样的方法即可。
+文件名就是内容哈希，内容永远不变，所以可以用一年的 immutable 缓存头返回。
+存进来的文件任何代码都不能再原地修改（清理元数据要在 store 之前做，缩略图写成新文件），
+否则哈希对不上，浏览器和 CDN 也还留着旧内容。
+"""
+import glob
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from importlib import import_module
+
+from flask import send_from_directory
+from werkzeug.utils import secure_filename
+from models import db, Blob, BlobRef, insert_ignoring_conflicts
+
+CHUNK_SIZE = 64 * 1024
+CACHE_MAX_AGE = 365 * 24 * 3600
+URL_PREFIX = '/uploads/'
+KEY_RE = re.compile(r'/uploads/([0-9a-f]{2}/[0-9a-f]{64}(?:\.[a-z0-9]+)?)')
+
+
+class LocalStorage:
+    """把文件存在本地目录下，key 即相对路径"""
+
+    def __init__(self, app):
+        self.root = app.config.setdefault('UPLOAD_STORAGE_ROOT', os.path.join(app.instance_path, 'uploads'))
+        os.makedirs(self.root, exist_ok=True)
+
+    def temp_dir(self):
+        """临时文件和最终文件放在同一个文件系统，保存时可以直接改名"""
+        return self.root
+
+    def save_file(self, key, temp_path):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def open(self, key):
+        """以二进制只读方式打开文件（导出归档时按块读取）"""
+        return open(self.local_path(key), 'rb')
+
+    def delete(self, key):
+        """删除文件及其衍生文件（缩略图等，形如 <hash>.thumb.webp）"""
+        root, _ = os.path.splitext(self.local_path(key))
+        for path in [self.local_path(key)] + glob.glob(root + '.*'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+    def send(self, key):
+        return send_from_directory(self.root, key, max_age=CACHE_MAX_AGE)
+
+
+class UploadStore:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.gc_grace = timedelta(days=1)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_path = app.config.setdefault('UPLOAD_STORAGE_BACKEND', 'storage.LocalStorage')
+        module_name, class_name = backend_path.rsplit('.', 1)
+        self.backend = getattr(import_module(module_name), class_name)(app)
+        self.gc_grace = timedelta(hours=app.config.setdefault('UPLOAD_GC_GRACE_HOURS', 24))
+
+    def store(self, stream, ext, uploader_id):
+        """
+        保存二进制流的内容，返回 (key, 是否为新文件)。ext 是带点的扩展名，由调用方根据校验出的文件格式给出，
+        不要直接用客户端的文件名。调用方负责提交事务
+        """
+        ext = os.path.splitext(secure_filename(f'x{ext}'))[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.backend.temp_dir(), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            hex_digest = digest.hexdigest()
+            key = f'{hex_digest[:2]}/{hex_digest}{ext}'
+            blob = db.session.get(Blob, key)
+            created = blob is None or not self.backend.exists(key)
+            if created:
+                self.backend.save_file(key, temp_path)
+            if blob is None:
+                # 相同的内容可能被两个请求同时上传，另一个先插入了就当作已经存好
+                insert_ignoring_conflicts(Blob, [{'key': key, 'size': size, 'uploader_id': uploader_id}])
+            else:
+                blob.last_uploaded_at = datetime.now()
+            return key, created
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def url(self, key):
+        return URL_PREFIX + key
+
+    def keys_in(self, *texts):
+        """从正文、封面地址等文本里找出引用的上传文件"""
+        keys = set()
+        for text in texts:
+            keys.update(KEY_RE.findall(text or ''))
+        return keys
+
+    def replace_keys(self, text, mapping):
+        """把文本里引用的上传文件按 {旧 key: 新 key} 换成新地址，其余内容不变"""
+        if not text or not mapping:
+            return text
+        return KEY_RE.sub(lambda m: URL_PREFIX + mapping.get(m.group(1), m.group(1)), text)
+
+    def local_path_for_url(self, url):
+        """上传文件地址对应的本地路径；后端不在本地时返回 None"""
+        match = KEY_RE.fullmatch(url or '')
+        if not match or not hasattr(self.backend, 'local_path'):
+            return None
+        return self.backend.local_path(match.group(1))
+
+    def set_refs(self, owner_type, owner_id, keys):
+        """把某个对象引用的文件更新为 keys，返回不再被它引用的 key。调用方负责提交"""
+        keys = {k for k in keys if db.session.get(Blob, k) is not None}
+        existing = {r.blob_key: r for r in BlobRef.query.filter_by(owner_type=owner_type, owner_id=owner_id)}
+        for key in keys - existing.keys():
+            db.session.add(BlobRef(blob_key=key, owner_type=owner_type, owner_id=owner_id))
+        removed = existing.keys() - keys
+        for key in removed:
+            db.session.delete(existing[key])
+        return removed
+
+    def collect_garbage(self, keys=None):
+        """
+        删除没人引用、且最近一段时间没被重新上传的文件，返回删除数量。
+        keys 为空时检查全部文件（给命令行用）；刚上传还没保存文章的编辑器图片靠宽限期保住。
+        """
+        query = Blob.query.filter(
+            Blob.last_uploaded_at < datetime.now() - self.gc_grace,
+            ~Blob.key.in_(db.session.query(BlobRef.blob_key))
+        )
+        if keys is not None:
+            if not keys:
+                return 0
+            query = query.filter(Blob.key.in_(list(keys)))
+
+        count = 0
+        for blob in query.all():
+            self.backend.delete(blob.key)
+            db.session.delete(blob)
+            count += 1
+        db.session.commit()
+        return count
+
+    def send(self, key):
+        response = self.backend.send(key)
+        response.headers['Cache-Control'] = f'public, max-age={CACHE_MAX_AGE}, immutable'
+        return response
+
+
+upload_store = UploadStore()
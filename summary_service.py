@@ -0,0 +1,126 @@
+"""
+AI 摘要服务。
+
+原来每次点击都在请求线程里同步调用 DeepSeek（最长 30 秒），而且同一篇文章反复生成。
+现在：
+- 结果按 (文章id, 正文哈希) 存进 ArticleSummary 表，正文不变直接返回；
+- 所有上游请求共用一个带连接池的 requests.Session，第一次请求上游时才导入 requests 并创建；
+- 生成工作登记为后台任务（jobs.py），接口立即返回任务状态，前端轮询；
+- 任务以 summary:文章id:正文哈希 为幂等键，同一篇文章同时被点击多次只会发起一次上游请求，
+  多进程部署时也是如此；上游失败会按退避策略自动重试；
+- 每个进程同时进行的上游请求不超过 SUMMARY_MAX_WORKERS 个。
+"""
+import threading
+
+from sqlalchemy.orm import undefer
+
+from jobs import job_queue
+from lazy_imports import optional_import
+from markdown_render import content_hash
+from models import db, Article, ArticleSummary, Job
+
+SYSTEM_PROMPT = "你是一个专业的博客助手，擅长提炼文章摘要。"
+
+
+def build_prompt(article):
+    # 限制长度防止超限
+    return f"请简要总结这篇文章的核心内容，字数控制在150字左右，使用亲和、专业的语气：\n标题：{article.title}\n正文：{article.content[:2000]}"
+
+
+class SummaryService:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.session = None
+        self._slots = None
+        self._session_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SUMMARY_MAX_WORKERS', 2)
+        app.config.setdefault('SUMMARY_TIMEOUT', 30)
+        app.config.setdefault('SUMMARY_MAX_ATTEMPTS', 3)
+        self.session = None
+        self._slots = threading.BoundedSemaphore(app.config['SUMMARY_MAX_WORKERS'])
+        job_queue.register('summary.generate', self._run, max_attempts=app.config['SUMMARY_MAX_ATTEMPTS'])
+
+    def get_or_enqueue(self, article):
+        """
+        返回 {'status': 'done', 'summary': ...} / {'status': 'pending'} / {'status': 'failed', 'message': ...}
+        没有现成结果时登记后台任务；失败状态只返回一次，下次请求会重新生成。
+        """
+        digest = content_hash(article.content)
+        cached = ArticleSummary.query.filter_by(article_id=article.id, content_hash=digest).first()
+        if cached:
+            return {'status': 'done', 'summary': cached.summary}
+
+        key = f'summary:{article.id}:{digest}'
+        job = Job.query.filter_by(key=key).order_by(Job.id.desc()).first()
+        if job and job.status == 'failed':
+            # 去掉幂等键，这次失败就不会再被查到，下次请求重新登记
+            job.key = None
+            db.session.commit()
+            return {'status': 'failed', 'message': job.last_error}
+        if job is None or job.status == 'done':
+            job_queue.enqueue('summary.generate', {'article_id': article.id, 'digest': digest}, key=key)
+            db.session.commit()
+        return {'status': 'pending'}
+
+    def _run(self, article_id, digest):
+        """后台任务：生成并保存摘要；文章已删除或正文已改动时直接结束"""
+        if ArticleSummary.query.filter_by(article_id=article_id, content_hash=digest).first():
+            return
+        article = Article.query.options(undefer(Article.content)).get(article_id)
+        if article is None or content_hash(article.content) != digest:
+            return
+        prompt = build_prompt(article)
+        db.session.commit()  # 请求上游可能要几十秒，先结束读事务
+
+        with self._slots:
+            summary = self.request_summary(prompt)
+        # 正文在生成期间被修改过也没关系，结果按旧哈希存，不会被新版本读到
+        if db.session.get(Article, article_id) is not None:
+            db.session.add(ArticleSummary(article_id=article_id, content_hash=digest, summary=summary))
+
+    def get_session(self):
+        """共用的 requests.Session；只有后台任务会请求上游，Web 进程启动时不必导入 requests"""
+        if self.session is not None:
+            return self.session
+        with self._session_lock:
+            if self.session is None:
+                requests = optional_import('requests')
+                if requests is None:
+                    raise RuntimeError('生成 AI 摘要需要安装 requests')
+                if not self.app.config.get('SUMMARY_API_KEY'):
+                    raise RuntimeError('没有配置 SUMMARY_API_KEY（环境变量 DEEPSEEK_API_KEY）')
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                        pool_maxsize=self.app.config['SUMMARY_MAX_WORKERS'])
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    "Authorization": f"Bearer {self.app.config['SUMMARY_API_KEY']}",
+                    "Content-Type": "application/json"
+                })
+                self.session = session
+        return self.session
+
+    def request_summary(self, prompt):
+        """调用上游接口，返回摘要文本"""
+        data = {
+            "model": self.app.config['SUMMARY_MODEL'],
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "stream": False
+        }
+        response = self.get_session().post(self.app.config['SUMMARY_API_URL'], json=data,
+                                          timeout=self.app.config['SUMMARY_TIMEOUT'])
+        response.raise_for_status()
+        return response.json()['choices'][0]['message']['content']
+
+
+summary_service = SummaryService()
@@ -0,0 +1,54 @@
+"""
+后台任务：由 job_queue 的工作线程或 flask run-jobs 进程执行，在应用上下文里运行。
+导入本模块即完成登记（job_queue 的任务表是全局的），create_app 会导入它。
+"""
+from sqlalchemy.orm import undefer
+
+from jobs import job_queue
+from markdown_render import render_article
+from models import db, Article
+from notifications import deliver_comment_notifications
+from page_cache import page_cache
+from related import update_related
+from search_index import index_article
+from storage import upload_store
+from term_counts import refresh_term_counts
+
+
+@job_queue.task('search.index')
+def index_article_job(article_id):
+    article = Article.query.options(undefer(Article.content)).get(article_id)
+    if article is not None:
+        index_article(article)
+
+
+@job_queue.task('term_counts.refresh')
+def refresh_term_counts_job(user_id):
+    refresh_term_counts(user_id)
+    db.session.commit()
+    # 保存文章时已经作废过一次，但那时计数还没更新，期间可能缓存了旧的云图页
+    page_cache.invalidate(f'user:{user_id}')
+
+
+@job_queue.task('related.update')
+def update_related_job(article_ids):
+    changed = update_related(article_ids)
+    db.session.commit()
+    page_cache.invalidate(*[f'article:{i}' for i in changed])
+
+
+@job_queue.task('render.warm', max_attempts=1)
+def warm_render_job(article_id):
+    article = Article.query.options(undefer(Article.content)).get(article_id)
+    if article is not None and not article.is_draft:
+        render_article(article)
+
+
+@job_queue.task('notifications.comments')
+def deliver_comment_notifications_job(user_id, since_id):
+    deliver_comment_notifications(user_id, since_id)
+
+
+@job_queue.task('uploads.gc')
+def collect_uploads_job(keys):
+    upload_store.collect_garbage(keys)
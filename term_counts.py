@@ -0,0 +1,61 @@
+"""
+内容云图（/user/<id>/archive）的分类、标签计数。
+
+aggregate_term_counts 用两条 GROUP BY 聚合查询算出全部计数；
+开启 TERM_COUNTERS 时，文章发布/撤回/删除后把结果写进 TermCount 表，
+页面只需读一次表。
+"""
+from models import db, Article, Category, Tag, TermCount, article_tags
+
+
+def aggregate_term_counts(user_id):
+    """返回 (分类列表, 标签列表)，每项为 {'id', 'name', 'count'}，只统计已发布文章"""
+    category_rows = db.session.query(Category.id, Category.name, db.func.count(Article.id)) \
+        .join(Article, Article.category_id == Category.id) \
+        .filter(Category.user_id == user_id, Article.is_draft == False) \
+        .group_by(Category.id, Category.name) \
+        .order_by(Category.id).all()
+
+    tag_rows = db.session.query(Tag.id, Tag.name, db.func.count(article_tags.c.article_id)) \
+        .join(article_tags, article_tags.c.tag_id == Tag.id) \
+        .join(Article, Article.id == article_tags.c.article_id) \
+        .filter(Tag.user_id == user_id, Article.is_draft == False) \
+        .group_by(Tag.id, Tag.name) \
+        .order_by(Tag.id).all()
+
+    categories = [{'id': i, 'name': name, 'count': count} for i, name, count in category_rows]
+    tags = [{'id': i, 'name': name, 'count': count} for i, name, count in tag_rows]
+    return categories, tags
+
+
+def refresh_term_counts(user_id):
+    """重算某个用户的物化计数，调用方负责提交事务"""
+    categories, tags = aggregate_term_counts(user_id)
+    TermCount.query.filter_by(user_id=user_id).delete()
+    db.session.add_all(
+        [TermCount(user_id=user_id, kind='category', term_id=c['id'], name=c['name'], count=c['count'])
+         for c in categories] +
+        [TermCount(user_id=user_id, kind='tag', term_id=t['id'], name=t['name'], count=t['count'])
+         for t in tags]
+    )
+
+
+def load_term_counts(user_id):
+    """从物化表读取计数，格式与 aggregate_term_counts 相同"""
+    categories, tags = [], []
+    for row in TermCount.query.filter_by(user_id=user_id).order_by(TermCount.term_id).all():
+        item = {'id': row.term_id, 'name': row.name, 'count': row.count}
+        (categories if row.kind == 'category' else tags).append(item)
+    return categories, tags
+
+
+def backfill_term_counts():
+    """给有已发布文章但还没有计数记录的用户补算，返回处理的用户数"""
+    counted = db.session.query(TermCount.user_id).distinct()
+    user_ids = [row[0] for row in db.session.query(Article.user_id)
+                .filter(Article.is_draft == False, Article.user_id.notin_(counted))
+                .distinct()]
+    for user_id in user_ids:
+        refresh_term_counts(user_id)
+    db.session.commit()
+    return len(user_ids)
@@ -0,0 +1,45 @@
+"""
+分类、标签的批量“查找或创建”。
+
+保存文章时原来每个标签一条 SELECT，新标签还要单独 commit 一次；
+这里改为一次 IN 查询找出已有的，缺失的批量 INSERT（依赖 (user_id, name) 唯一索引，
+并发创建同名标签时冲突的行直接忽略），再查一次拿到它们的 id。
+全部在调用方的事务里完成，不会提交，中途失败也不会留下孤立的标签。
+"""
+from models import Category, Tag, insert_ignoring_conflicts
+
+
+def parse_tag_names(raw):
+    """把 “a, b，c” 拆成去重后的标签名列表，保持输入顺序"""
+    names = []
+    for name in (raw or '').replace('，', ',').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_terms(model, user_id, names):
+    """返回与 names 顺序一致的对象列表，不存在的先创建"""
+    if not names:
+        return []
+
+    def lookup(wanted):
+        return {t.name: t for t in model.query.filter(model.user_id == user_id, model.name.in_(wanted))}
+
+    found = lookup(names)
+    missing = [n for n in names if n not in found]
+    if missing:
+        insert_ignoring_conflicts(model, [{'name': n, 'user_id': user_id} for n in missing])
+        found.update(lookup(missing))
+    return [found[n] for n in names]
+
+
+def resolve_tags(user_id, names):
+    return resolve_terms(Tag, user_id, names)
+
+
+def resolve_category(user_id, name):
+    """分类名为空时返回 None"""
+    name = (name or '').strip()
+    return resolve_terms(Category, user_id, [name])[0] if name else None
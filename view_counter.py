@@ -0,0 +1,148 @@
+"""
+文章浏览计数和热度。
+
+每打开一次文章页只在内存里加一：计数按线程分成 VIEW_COUNTER_SHARDS 片，各片一把锁，
+并发的请求几乎不会互相等待。后台线程每 VIEW_FLUSH_INTERVAL 秒把攒下的增量合并成一个事务写回，
+同一篇文章不论这段时间被看了多少次都只有一条 UPDATE，读者不再排队等 SQLite 的写锁。
+进程正常退出时会再写回一次；被强制杀掉时最多丢失最近一个周期的计数。
+
+热度 trending_score 是按时间衰减的浏览数：t 时刻的一次浏览到 now 时刻只剩 2^(-(now - t) / 半衰期)。
+直接存衰减后的值需要定期更新全表，这里存的是 ln Σ e^(λ(t - TRENDING_EPOCH))，λ = ln2 / 半衰期，
+即把所有浏览折算到固定时刻后取对数。它不随时间变化，只在有新浏览时增大，
+而任一时刻按它排序都和按衰减后的热度排序一致，所以首页 ?sort=trending 直接按索引列排序。
+写回时用 log-sum-exp 在 UPDATE 里原地合并，多个进程同时写回也不会互相覆盖。
+
+由 nginx 直接返回的静态导出页面（见 static_export.py）不经过 Flask，不计入浏览数。
+"""
+import atexit
+import math
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import make_response
+from sqlalchemy import bindparam, update
+
+from models import db, Article
+
+TRENDING_EPOCH = datetime(2024, 1, 1).timestamp()
+
+
+def trending_offset(timestamp, half_life):
+    """timestamp 时刻的一次浏览折算到 TRENDING_EPOCH 后的对数权重"""
+    return (timestamp - TRENDING_EPOCH) * math.log(2) / half_life
+
+
+def _logaddexp(column, value):
+    """SQL 表达式 ln(e^column + e^value)，先提出较大的一项，不会溢出"""
+    return db.case((column >= value, column + db.func.ln(1 + db.func.exp(value - column))),
+                   else_=value + db.func.ln(1 + db.func.exp(column - value)))
+
+
+class ViewCounter:
+
+    def __init__(self, app=None):
+        self.app = None
+        self._shards = []
+        self.enabled = True
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('VIEW_COUNTER_SHARDS', 16)
+        app.config.setdefault('VIEW_FLUSH_INTERVAL', 10)  # 秒
+        app.config.setdefault('TRENDING_HALF_LIFE', 48 * 3600)  # 秒；改动后旧的热度要过一段时间才会按新值收敛
+        self._shards = [(threading.Lock(), {}) for _ in range(app.config['VIEW_COUNTER_SHARDS'])]
+        app.before_request(self._start_flusher)
+
+    def hit(self, article_id, count=1):
+        lock, counts = self._shards[threading.get_ident() % len(self._shards)]
+        with lock:
+            counts[article_id] = counts.get(article_id, 0) + count
+
+    def counted(self, view):
+        """视图装饰器，放在 page_cache.cached 外层，缓存命中的请求也计数；路由参数里要有 article_id"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if self.enabled and response.status_code in (200, 304):
+                self.hit(kwargs['article_id'])
+            return response
+        return wrapper
+
+    def pending(self):
+        """还没写回的浏览数 {文章id: 次数}"""
+        merged = {}
+        for lock, counts in self._shards:
+            with lock:
+                for article_id, count in counts.items():
+                    merged[article_id] = merged.get(article_id, 0) + count
+        return merged
+
+    def _drain(self):
+        merged = {}
+        for lock, counts in self._shards:
+            with lock:
+                taken = counts.copy()
+                counts.clear()
+            for article_id, count in taken.items():
+                merged[article_id] = merged.get(article_id, 0) + count
+        return merged
+
+    def flush(self):
+        """把攒下的浏览数写回数据库，返回涉及的文章数；需要在应用上下文里调用"""
+        counts = self._drain()
+        if not counts:
+            return 0
+        offset = trending_offset(time.time(), self.app.config['TRENDING_HALF_LIFE'])
+        table = Article.__table__
+        statement = update(table).where(table.c.id == bindparam('b_id')).values(
+            view_count=table.c.view_count + bindparam('b_count', type_=db.Integer),
+            trending_score=_logaddexp(table.c.trending_score, bindparam('b_weight', type_=db.Float)),
+            update_time=table.c.update_time,  # 浏览不算修改，不能触发 onupdate 改掉文章的更新时间
+        )
+        rows = [{'b_id': article_id, 'b_count': count, 'b_weight': math.log(count) + offset}
+                for article_id, count in sorted(counts.items())]  # 固定顺序加锁，多进程写回不会死锁
+        try:
+            db.session.connection().execute(statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # 写回失败时把计数放回去，下个周期再试
+            for article_id, count in counts.items():
+                self.hit(article_id, count)
+            raise
+        return len(counts)
+
+    # --- 后台写回线程 ---
+    def _start_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_in_context)
+
+    def _run(self):
+        while not self._stop.wait(self.app.config['VIEW_FLUSH_INTERVAL']):
+            try:
+                self._flush_in_context()
+            except Exception:
+                self.app.logger.exception('浏览数写回失败')
+
+    def _flush_in_context(self):
+        with self.app.app_context():
+            return self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+
+view_counter = ViewCounter()
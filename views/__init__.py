@@ -0,0 +1,15 @@
+"""
+页面和接口按功能拆成几个蓝图，由 create_app 注册：
+- auth：注册、登录、登出；
+- blog：公开页面和评论；
+- author：登录用户的写作、个人面板、导入导出；
+- uploads：图片上传和上传文件的访问。
+蓝图之间共用的辅助函数在 views/common.py。模板里的地址要带蓝图名，如 url_for('blog.view_article', ...)。
+"""
+from views import auth, author, blog, uploads
+
+
+def register_blueprints(app):
+    auth.login_manager.init_app(app)
+    for module in (auth, blog, author, uploads):
+        app.register_blueprint(module.bp)
@@ -0,0 +1,73 @@
+"""注册、登录、登出"""
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, request, flash
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from models import db, User
+
+bp = Blueprint('auth', __name__)
+
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
+
+
+# 注册
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')  # 实际开发建议用 generate_password_hash
+        if User.query.filter_by(username=username).first():
+            flash('用户名已存在')
+            return redirect(url_for('auth.register'))
+
+        hashed_password = generate_password_hash(password)
+
+        new_user = User(username=username, password=hashed_password)
+        db.session.add(new_user)
+        db.session.commit()
+        flash('注册成功！', 'success')
+        return redirect(url_for('auth.login'))
+    return render_template('register.html')
+
+
+# 登录
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('blog.index'))
+
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        user = User.query.filter_by(username=username).first()
+
+        # --- 核心修改：校验哈希密码 ---
+        # 第一个参数是数据库存的密文，第二个参数是用户输入的明文
+        if user and check_password_hash(user.password, password):
+            login_user(user)
+            user.last_login = datetime.now()
+            db.session.commit()
+            flash("登陆成功！", 'success')
+            return redirect(url_for('author.dashboard'))
+        else:
+            flash('用户名或密码错误', 'error')
+
+    return render_template('login.html')
+
+
+# 登出
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('登出成功！', 'success')
+    return redirect(url_for('auth.login'))
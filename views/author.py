@@ -0,0 +1,344 @@
+"""登录用户的后台：个人面板、写作和编辑、自动保存与历史版本、导入导出、后台任务状态"""
+from datetime import datetime
+
+from flask import (Blueprint, Response, current_app, render_template, redirect, url_for, request, flash, abort,
+                   stream_with_context)
+from flask_login import login_required, current_user
+from sqlalchemy.orm import undefer
+
+from blog_archive import export_blog, import_blog, ArchiveError
+from image_pipeline import validate_image, InvalidImage
+from jobs import job_queue
+from markdown_render import render_cache
+from models import db, Article, ArticleRevision, Category, Tag, Comment, Job
+from notifications import unread_notifications, mark_notifications_read
+from related import forget_article
+from revisions import autosave, note_full_save, list_revisions, load_revision, PatchError
+from search_index import remove_article
+from storage import upload_store
+from terms import parse_tag_names, resolve_tags, resolve_category
+from views.common import (save_upload, sync_upload_refs, enqueue_article_jobs, enqueue_upload_gc,
+                          invalidate_article_pages, invalidate_user_pages, finish_import)
+
+bp = Blueprint('author', __name__)
+
+
+# 个人面板
+@bp.route('/dashboard')
+@login_required
+def dashboard():
+    # 统计信息
+    article_count = Article.query.filter_by(user_id=current_user.id).count()
+    category_count = Category.query.filter_by(user_id=current_user.id).count()
+    tag_count = Tag.query.filter_by(user_id=current_user.id).count()
+
+    articles = Article.query.filter_by(user_id=current_user.id).order_by(Article.update_time.desc()).all()
+
+    return render_template('dashboard.html',
+                           article_count=article_count,
+                           category_count=category_count,
+                           tag_count=tag_count,
+                           articles=articles,
+                           notifications=unread_notifications(current_user.id))
+
+
+@bp.route('/notifications/read', methods=['POST'])
+@login_required
+def read_notifications():
+    mark_notifications_read(current_user.id)
+    db.session.commit()
+    return redirect(url_for('author.dashboard'))
+
+
+@bp.route('/article/new', methods=['GET', 'POST'])
+@login_required
+def create_article():
+    if request.method == 'POST':
+        title = request.form.get('title') or "未命名草稿"
+        summary_text = request.form.get('summary')
+        content = request.form.get('content')
+        category_name = request.form.get('category', '')
+        tag_names = parse_tag_names(request.form.get('tags'))
+        post_status = request.form.get('post_status', 'published')
+
+        # 1. 处理分类（不存在则创建，与文章在同一个事务里）
+        category = resolve_category(current_user.id, category_name)
+
+        # 2. 创建文章对象 (先不填 cover_url)
+        new_article = Article(
+            title=title,
+            summary=summary_text,
+            content=content,
+            user_id=current_user.id,
+            category_id=category.id if category else None,
+            is_draft=(post_status == 'draft')
+        )
+
+        # 3. 重点：先将对象加入 session 并 flush
+        db.session.add(new_article)
+        # flush 的作用是向数据库请求生成 ID，但还不正式提交事务
+        db.session.flush()
+
+        # 4. 现在有了 ID，处理封面上传
+        cover_file = request.files.get('cover_file')
+        if cover_file and cover_file.filename != '':
+            cover_path = save_article_cover(cover_file)
+            if cover_path:
+                new_article.cover_url = cover_path  # 将路径补填回去
+
+        # 5. 处理标签：一次查出已有的，缺失的批量创建
+        new_article.tags = resolve_tags(current_user.id, tag_names)
+
+        # 6. 登记上传文件引用，全文索引、云图计数等交给后台任务，和文章一起提交
+        sync_upload_refs(new_article)
+        enqueue_article_jobs(new_article)
+
+        # 7. 正式提交所有修改
+        db.session.commit()
+
+        invalidate_article_pages(new_article, [new_article.category_id], [t.id for t in new_article.tags])
+
+        flash('内容已自动保存到草稿箱' if post_status == 'draft' else '文章发布成功！')
+        return redirect(url_for('author.dashboard'))
+
+    user_categories = Category.query.filter_by(user_id=current_user.id).all()
+    return render_template('write_article.html', categories=user_categories)
+
+
+# --- 删除文章 ---
+@bp.route('/article/delete/<int:article_id>')
+@login_required
+def delete_article(article_id):
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first_or_404()
+
+    remove_article(article.id)
+    stale_related = forget_article(article.id)
+    # 评论直接批量删除，不必逐条加载后再级联删除
+    Comment.query.filter_by(article_id=article.id).delete(synchronize_session=False)
+    ArticleRevision.query.filter_by(article_id=article.id).delete(synchronize_session=False)
+    removed_uploads = upload_store.set_refs('article', article.id, set())
+    category_ids, tag_ids = [article.category_id], [t.id for t in article.tags]
+    db.session.delete(article)
+    if current_app.config['TERM_COUNTERS']:
+        job_queue.enqueue('term_counts.refresh', {'user_id': current_user.id}, key=f'term_counts:{current_user.id}',
+                          user_id=current_user.id)
+    if stale_related:
+        job_queue.enqueue('related.update', {'article_ids': stale_related})
+    enqueue_upload_gc(removed_uploads)
+    db.session.commit()
+    # 提交之后再作废缓存，否则提交前来的请求会把还没删掉的文章重新缓存起来
+    invalidate_article_pages(article, category_ids, tag_ids)
+    render_cache.invalidate(article_id)
+    flash('文章已删除')
+    return redirect(url_for('author.dashboard'))
+
+
+# --- 编辑文章 ---
+@bp.route('/article/edit/<int:article_id>', methods=['GET', 'POST'])
+@login_required
+def edit_article(article_id):
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id) \
+        .options(undefer(Article.content)).first_or_404()
+
+    if request.method == 'POST':
+        # 记下修改前的分类和标签，它们的列表页也要刷新
+        old_category_id = article.category_id
+        old_tag_ids = [t.id for t in article.tags]
+        old_content = article.content
+        was_published = not article.is_draft
+
+        article.title = request.form.get('title')
+        article.summary = request.form.get('summary')
+        article.content = request.form.get('content')
+
+        # 1. 处理分类
+        category = resolve_category(current_user.id, request.form.get('category', ''))
+        article.category_id = category.id if category else None
+
+        # 2. 处理封面更新 (如果有新上传的文件)
+        cover_file = request.files.get('cover_file')
+        if cover_file and cover_file.filename != '':
+            cover_path = save_article_cover(cover_file)
+            if cover_path:
+                article.cover_url = cover_path
+
+        # 3. 更新标签：只增删有变化的关联，不清空重建
+        new_tags = resolve_tags(current_user.id, parse_tag_names(request.form.get('tags')))
+        new_tag_ids = {t.id for t in new_tags}
+        for tag in [t for t in article.tags if t.id not in new_tag_ids]:
+            article.tags.remove(tag)
+        for tag in new_tags:
+            if tag.id not in old_tag_ids:
+                article.tags.append(tag)
+
+        article.is_draft = (request.form.get('post_status') == 'draft')
+        note_full_save(article, old_content)
+        enqueue_upload_gc(sync_upload_refs(article))
+        enqueue_article_jobs(article, was_published)
+        # 提交前清掉旧的渲染结果，免得把后台刚预热好的新版本也删了
+        render_cache.invalidate(article.id)
+        db.session.commit()
+        invalidate_article_pages(article, [old_category_id, article.category_id],
+                                 old_tag_ids + [t.id for t in article.tags])
+        flash('文章更新成功！')
+        return redirect(url_for('author.dashboard'))
+
+    user_categories = Category.query.filter_by(user_id=current_user.id).all()
+    tag_str = ",".join([t.name for t in article.tags])
+    return render_template('edit_article.html', article=article, categories=user_categories, tag_str=tag_str)
+
+
+# 新建页第一次自动保存时先建一篇草稿，之后只发补丁
+@bp.route('/api/drafts', methods=['POST'])
+@login_required
+def create_draft():
+    data = request.get_json(silent=True) or {}
+    article = Article(
+        title=(data.get('title') or '')[:100] or "未命名草稿",
+        summary=data.get('summary'),
+        content=data.get('content') or '',
+        user_id=current_user.id,
+        is_draft=True,
+        version=0
+    )
+    db.session.add(article)
+    db.session.flush()
+    sync_upload_refs(article)
+    db.session.commit()
+    return {
+        "success": True,
+        "id": article.id,
+        "version": article.version,
+        "saved_at": article.update_time.strftime('%H:%M:%S'),
+        "edit_url": url_for('author.edit_article', article_id=article.id),
+        "autosave_url": url_for('author.autosave_article', article_id=article.id)
+    }, 201
+
+
+# 草稿自动保存：{"version": 基线版本, "patches": [[start, end, text], ...], "length": 新正文长度, "title", "summary"}
+@bp.route('/api/articles/<int:article_id>/autosave', methods=['POST'])
+@login_required
+def autosave_article(article_id):
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id) \
+        .options(undefer(Article.content)).first_or_404()
+    if not article.is_draft:
+        return {"success": False, "message": "已发布的文章请点击“保存修改”提交"}, 400
+
+    data = request.get_json(silent=True) or {}
+    old_content = article.content
+    try:
+        version = autosave(article, data.get('version'), data.get('patches'), data.get('length'),
+                           title=data.get('title'), summary=data.get('summary'))
+    except PatchError:
+        db.session.rollback()
+        version = None
+    if version is None:
+        # 基线过期或补丁对不上（其它页面保存过）：编辑器停止自动保存，由用户决定重新载入还是手动覆盖
+        article = db.session.get(Article, article_id)
+        return {"success": False, "conflict": True, "version": article.version or 0,
+                "message": "草稿已在其它页面修改"}, 409
+
+    if article.content != old_content:
+        enqueue_upload_gc(sync_upload_refs(article))
+    db.session.commit()
+    return {"success": True, "version": version, "saved_at": article.update_time.strftime('%H:%M:%S')}
+
+
+@bp.route('/api/articles/<int:article_id>/revisions')
+@login_required
+def article_revisions(article_id):
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first_or_404()
+    return {"revisions": [{"version": r.version, "created_at": r.created_at.isoformat()}
+                          for r in list_revisions(article.id)]}
+
+
+@bp.route('/api/articles/<int:article_id>/revisions/<int:version>')
+@login_required
+def article_revision(article_id, version):
+    article = Article.query.filter_by(id=article_id, user_id=current_user.id).first_or_404()
+    content = load_revision(article, version)
+    if content is None:
+        abort(404)
+    return {"version": version, "content": content}
+
+
+def save_article_cover(file):
+    if file and file.filename != '':
+        try:
+            ext = validate_image(file)
+        except InvalidImage as e:
+            flash(f'封面未保存：{e}', 'error')
+            return None
+
+        # 按内容哈希存储，返回数据库存储的访问地址
+        return save_upload(file, 'cover', ext)
+    return None
+
+
+@bp.route('/update_profile', methods=['POST'])
+@login_required
+def update_profile():
+    current_user.nickname = request.form.get('nickname')
+    current_user.gender = request.form.get('gender')
+    current_user.repo_link = request.form.get('repo_link')
+    current_user.bio = request.form.get('bio')
+
+    db.session.commit()
+    invalidate_user_pages(current_user.id)
+    flash('个人资料更新成功！', 'success')
+    return redirect(url_for('author.dashboard'))
+
+
+# 导出自己的全部文章：?format=zip（默认）或 tar，边生成边下载
+@bp.route('/api/export')
+@login_required
+def export_blog_view():
+    fmt = 'tar' if request.args.get('format') == 'tar' else 'zip'
+    filename = f'blog-{current_user.id}-{datetime.now():%Y%m%d}.' + ('tar.gz' if fmt == 'tar' else 'zip')
+    return Response(stream_with_context(export_blog(current_user.id, fmt)),
+                    mimetype='application/gzip' if fmt == 'tar' else 'application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+# 从导出的归档（或一批 Markdown 文件打成的 zip/tar）导入文章
+@bp.route('/api/import', methods=['POST'])
+@login_required
+def import_blog_view():
+    file = request.files.get('archive')
+    if not file:
+        return {"success": False, "message": "未找到文件"}, 400
+    try:
+        result = import_blog(current_user.id, file.stream, file.filename)
+    except ArchiveError as e:
+        db.session.rollback()
+        return {"success": False, "message": str(e)}, 400
+    finish_import(current_user.id)
+    return {"success": True, **result}
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'last_error': job.last_error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+# 后台任务状态：只能看自己触发的任务
+@bp.route('/api/jobs')
+@login_required
+def api_jobs():
+    jobs = Job.query.filter_by(user_id=current_user.id).order_by(Job.id.desc()).limit(20).all()
+    return {'jobs': [job_to_dict(j) for j in jobs]}
+
+
+@bp.route('/api/jobs/<int:job_id>')
+@login_required
+def api_job(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return job_to_dict(job)
@@ -0,0 +1,278 @@
+"""公开页面：首页信息流、文章页和评论、用户主页、分类/标签筛选、搜索、AI 摘要"""
+import hashlib
+
+from flask import Blueprint, current_app, render_template, redirect, url_for, request, flash, abort
+from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload, undefer
+
+from markdown_render import render_article
+from models import db, User, Article, Category, Tag, Comment
+from notifications import queue_comment_notification
+from page_cache import page_cache
+from pagination import keyset_paginate
+from rate_limit import rate_limiter
+from related import related_articles
+from search_index import search_articles
+from summary_service import summary_service
+from term_counts import aggregate_term_counts, load_term_counts
+from view_counter import view_counter
+from views.common import get_visible_article
+
+bp = Blueprint('blog', __name__)
+
+FEED_SORTS = {'latest': Article.update_time, 'trending': Article.trending_score}
+
+
+def query_feed_page(cursor=None, sort='latest'):
+    """首页信息流：按最新或热度游标分页 + 批量预加载标签和作者，查询数与文章总数无关"""
+    query = Article.query.filter_by(is_draft=False).options(
+        selectinload(Article.tags),
+        selectinload(Article.author)
+    )
+    return keyset_paginate(query, FEED_SORTS[sort], Article.id,
+                           cursor=cursor, per_page=current_app.config['FEED_PER_PAGE'])
+
+
+def feed_sort():
+    sort = request.args.get('sort', 'latest')
+    return sort if sort in FEED_SORTS else 'latest'
+
+
+def query_comment_page(article_id, cursor=None):
+    """文章评论：按时间倒序游标分页，作者一次性预加载"""
+    query = Comment.query.filter_by(article_id=article_id).options(selectinload(Comment.author))
+    return keyset_paginate(query, Comment.timestamp, Comment.id,
+                           cursor=cursor, per_page=current_app.config['COMMENTS_PER_PAGE'])
+
+
+# 首页
+@bp.route('/')
+@page_cache.cached(lambda: ['feed'])
+def index():
+    # 查询已发布的文章（is_draft=False），按时间或热度倒序，每次只取一页
+    # 热度榜随浏览变化，不做失效，靠 PAGE_CACHE_TTL 过期
+    sort = feed_sort()
+    articles, next_cursor = query_feed_page(request.args.get('cursor'), sort)
+    if articles and sort == 'latest':
+        page_cache.mark_modified(articles[0].update_time)
+    return render_template('index.html', articles=articles, next_cursor=next_cursor, sort=sort)
+
+
+# 首页信息流的 JSON 版本，供无限滚动使用
+@bp.route('/api/articles')
+def api_feed():
+    articles, next_cursor = query_feed_page(request.args.get('cursor'), feed_sort())
+    return {
+        'articles': [{
+            'id': a.id,
+            'title': a.title,
+            'summary': a.summary,
+            'cover_url': a.cover_url,
+            'update_time': a.update_time.isoformat(),
+            'view_count': a.view_count or 0,
+            'url': url_for('blog.view_article', article_id=a.id),
+            'author': {'id': a.author.id, 'name': a.author.nickname or a.author.username},
+            'tags': [{'id': t.id, 'name': t.name} for t in a.tags],
+        } for a in articles],
+        # 直接复用首页卡片模板，前端拼接即可
+        'html': render_template('_article_card.html', articles=articles),
+        'next_cursor': next_cursor
+    }
+
+
+# 文章详细页面
+@bp.route('/article/<int:article_id>')
+@view_counter.counted
+@page_cache.cached(lambda article_id: [f'article:{article_id}'])
+def view_article(article_id):
+    # 获取文章，如果不存在则返回 404；草稿且当前用户不是作者，则不许看
+    article = get_visible_article(article_id, undefer(Article.content))
+    if article is None:
+        flash("该文章尚未发布")
+        return redirect(url_for('blog.index'))
+
+    # 服务端渲染正文和目录（带缓存）；返回 None 时模板退回前端渲染
+    rendered = render_article(article)
+    # 评论只取第一页，其余通过 api_comments 按需加载
+    comments, next_cursor = query_comment_page(article.id)
+    related = related_articles(article.id, current_app.config['RELATED_PER_PAGE'])
+    page_cache.mark_modified(article.update_time)
+    if comments:
+        page_cache.mark_modified(comments[0].timestamp)
+    return render_template('article_detail.html', article=article, rendered=rendered,
+                           comments=comments, next_cursor=next_cursor, related=related)
+
+
+# 评论“加载更多”
+@bp.route('/api/articles/<int:article_id>/comments')
+@page_cache.cached(lambda article_id: [f'article:{article_id}'])
+def api_comments(article_id):
+    article = get_visible_article(article_id)
+    if article is None:
+        abort(404)
+    comments, next_cursor = query_comment_page(article.id, request.args.get('cursor'))
+    return {
+        'comments': [{
+            'id': c.id,
+            'content': c.content,
+            'timestamp': c.timestamp.isoformat(),
+            'author': {'id': c.author.id, 'name': c.author.nickname or c.author.username,
+                       'avatar_url': c.author.avatar_url},
+        } for c in comments],
+        'html': render_template('_comment_item.html', comments=comments),
+        'next_cursor': next_cursor
+    }
+
+
+@bp.route('/article/<int:article_id>/comment', methods=['POST'])
+@login_required
+def post_comment(article_id):
+    # 限流和去重都在访问数据库之前判断，刷屏的请求不会占用写锁。
+    # 评论必须登录，只按用户限流：反向代理后面 remote_addr 都是代理的地址，按 IP 会让所有人共用一个桶
+    back = redirect(url_for('blog.view_article', article_id=article_id))
+    wait = rate_limiter.limit([f'comment:user:{current_user.id}'],
+                              current_app.config['COMMENT_RATE_BURST'], current_app.config['COMMENT_RATE_INTERVAL'])
+    if wait:
+        flash(f"评论太频繁了，请 {wait} 秒后再试", "error")
+        return back
+    content = (request.form.get('content') or '').strip()
+    if not content:
+        flash("评论内容不能为空", "error")
+        return back
+    if len(content) > current_app.config['COMMENT_MAX_LENGTH']:
+        flash(f"评论不能超过 {current_app.config['COMMENT_MAX_LENGTH']} 字", "error")
+        return back
+    digest = hashlib.sha1(' '.join(content.split()).encode('utf-8')).hexdigest()
+    dedupe_key = f'comment:{current_user.id}:{article_id}:{digest}'
+    if rate_limiter.seen(dedupe_key):
+        flash("请不要重复发表相同的评论", "error")
+        return back
+
+    article = get_visible_article(article_id)
+    if article is None:
+        abort(404)
+    new_comment = Comment(
+        content=content,
+        user_id=current_user.id,
+        article_id=article_id
+    )
+    db.session.add(new_comment)
+    # 在数据库里原子地 +1，并发评论也不会丢计数；评论不算修改文章，保留原来的更新时间
+    Article.query.filter_by(id=article_id).update(
+        {Article.comment_count: db.func.coalesce(Article.comment_count, 0) + 1,
+         Article.update_time: Article.update_time}, synchronize_session=False)
+    db.session.flush()
+    queue_comment_notification(new_comment, article, current_app.config['COMMENT_NOTIFY_DELAY'])
+    db.session.commit()
+    rate_limiter.first_seen(dedupe_key, current_app.config['COMMENT_DEDUPE_WINDOW'])  # 保存成功后才记下
+    page_cache.invalidate(f'article:{article_id}')
+    flash("评论发表成功！", "success")
+    return redirect(url_for('blog.view_article', article_id=article_id))
+
+
+@bp.route('/user/<int:user_id>')
+@page_cache.cached(lambda user_id: [f'user:{user_id}', f'author:{user_id}'])
+def public_profile(user_id):
+    # 获取被查看的用户信息
+    user = User.query.get_or_404(user_id)
+    # 统计该用户的数据
+    article_cnt = Article.query.filter_by(user_id=user.id, is_draft=False).count()
+    category_cnt = Category.query.filter_by(user_id=user.id).count()
+    tag_cnt = Tag.query.filter_by(user_id=user.id).count()
+    # 只查询该用户“已发布”的文章，不能让别人看到草稿
+    articles = Article.query.filter_by(user_id=user.id, is_draft=False).order_by(Article.update_time.desc()).all()
+    if articles:
+        page_cache.mark_modified(articles[0].update_time)
+
+    return render_template('user_profile.html',
+                           target_user=user,
+                           articles=articles,
+                           article_count=article_cnt,
+                           category_count=category_cnt,
+                           tag_count=tag_cnt)
+
+
+@bp.route('/user/<int:user_id>/category/<int:cat_id>')
+@page_cache.cached(lambda user_id, cat_id: [f'category:{cat_id}', f'author:{user_id}'])
+def category_filter(user_id, cat_id):
+    user = User.query.get_or_404(user_id)
+    category = Category.query.get_or_404(cat_id)
+    # 筛选该用户、该分类下已发布的文章
+    articles = Article.query.filter_by(user_id=user_id, category_id=cat_id, is_draft=False).order_by(
+        Article.update_time.desc()).all()
+    if articles:
+        page_cache.mark_modified(articles[0].update_time)
+    return render_template('filter_results.html', user=user, filter_name=category.name, articles=articles, type='分类')
+
+
+# --- 标签筛选页 ---
+@bp.route('/user/<int:user_id>/tag/<int:tag_id>')
+@page_cache.cached(lambda user_id, tag_id: [f'tag:{tag_id}', f'author:{user_id}'])
+def tag_filter(user_id, tag_id):
+    user = User.query.get_or_404(user_id)
+    tag = Tag.query.get_or_404(tag_id)
+    # 多对多查询：通过标签找文章
+    articles = tag.articles.filter_by(user_id=user_id, is_draft=False).order_by(Article.update_time.desc()).all()
+    if articles:
+        page_cache.mark_modified(articles[0].update_time)
+    return render_template('filter_results.html', user=user, filter_name=tag.name, articles=articles, type='标签')
+
+
+# --- 词云/聚合页 ---
+@bp.route('/user/<int:user_id>/archive')
+@page_cache.cached(lambda user_id: [f'user:{user_id}', f'author:{user_id}'])
+def user_archive(user_id):
+    user = User.query.get_or_404(user_id)
+
+    # 分类、标签及其文章数：读物化计数表，或者现场做两次聚合查询
+    if current_app.config['TERM_COUNTERS']:
+        categories_data, tags_data = load_term_counts(user.id)
+    else:
+        categories_data, tags_data = aggregate_term_counts(user.id)
+
+    return render_template('user_cloud.html', user=user, categories=categories_data, tags=tags_data)
+
+
+@bp.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'article')  # 默认搜文章
+    page = request.args.get('page', 1, type=int) or 1
+    per_page = current_app.config['SEARCH_PER_PAGE']
+    results = []
+    total = 0
+    snippets = {}
+
+    if query:
+        if search_type == 'article':
+            # 全文检索已发布文章的标题、摘要和正文，按相关度排序
+            results, total, snippets = search_articles(query, page=page, per_page=per_page)
+        elif search_type == 'user':
+            # 模糊搜索用户昵称或账号
+            results = User.query.filter(
+                db.or_(
+                    User.nickname.contains(query),
+                    User.username.contains(query)
+                )
+            ).all()
+            total = len(results)
+
+    has_next = search_type == 'article' and page * per_page < total
+    return render_template('search.html', query=query, search_type=search_type, results=results,
+                           total=total, snippets=snippets, page=page, has_next=has_next)
+
+
+@bp.route('/api/summarize/<int:article_id>')
+def ai_summarize(article_id):
+    # 草稿只有作者本人能生成、查看摘要
+    article = get_visible_article(article_id, undefer(Article.content))
+    if article is None:
+        abort(404)
+
+    # 已有摘要直接返回；否则提交后台任务，前端看到 pending 后轮询本接口
+    result = summary_service.get_or_enqueue(article)
+    if result['status'] == 'done':
+        return {"success": True, "status": "done", "summary": result['summary']}
+    if result['status'] == 'failed':
+        return {"success": False, "status": "failed", "message": result['message']}
+    return {"success": True, "status": "pending"}, 202
@@ -0,0 +1,80 @@
+"""各蓝图共用的辅助函数：上传文件登记、文章保存后的后台任务、缓存页失效"""
+from flask import current_app
+from flask_login import current_user
+
+from image_pipeline import image_pipeline, clean_upload
+from jobs import job_queue
+from models import db, Article, Comment
+from page_cache import page_cache
+from storage import upload_store
+
+
+def save_upload(file, kind, ext):
+    """
+    保存已经校验过的上传图片（ext 是 validate_image 的返回值）：先清理元数据再按内容存储（相同内容只存一份），
+    登记生成缩略图的后台任务，返回访问地址。调用方负责提交
+    """
+    key, _ = upload_store.store(clean_upload(file), ext, current_user.id)
+    # 重复上传的文件可能是别的用途，需要补上这种用途的缩略图（已经有的不会重复生成）
+    image_pipeline.enqueue(key, kind, user_id=current_user.id)
+    return upload_store.url(key)
+
+
+def sync_upload_refs(article):
+    """根据正文和封面登记文章引用的上传文件，返回不再引用的文件"""
+    return upload_store.set_refs('article', article.id, upload_store.keys_in(article.content, article.cover_url))
+
+
+def enqueue_article_jobs(article, was_published=False):
+    """文章保存后的派生工作：全文索引、云图计数、相关文章、预热渲染缓存。和文章在同一个事务里登记"""
+    job_queue.enqueue('search.index', {'article_id': article.id}, key=f'search:{article.id}', user_id=article.user_id)
+    if current_app.config['TERM_COUNTERS']:
+        job_queue.enqueue('term_counts.refresh', {'user_id': article.user_id}, key=f'term_counts:{article.user_id}',
+                          user_id=article.user_id)
+    if not article.is_draft or was_published:
+        job_queue.enqueue('related.update', {'article_ids': [article.id]}, key=f'related:{article.id}',
+                          user_id=article.user_id)
+    if not article.is_draft:
+        job_queue.enqueue('render.warm', {'article_id': article.id}, key=f'render:{article.id}',
+                          user_id=article.user_id)
+
+
+def enqueue_upload_gc(keys):
+    """不再被引用的上传文件交给后台清理"""
+    if keys:
+        job_queue.enqueue('uploads.gc', {'keys': sorted(keys)})
+
+
+def invalidate_article_pages(article, category_ids=(), tag_ids=()):
+    """文章变化后作废相关的缓存页：文章页、作者主页和云图、首页，以及涉及的分类/标签页"""
+    page_cache.invalidate(f'article:{article.id}', f'user:{article.user_id}', 'feed',
+                          *[f'category:{c}' for c in category_ids if c],
+                          *[f'tag:{t}' for t in tag_ids])
+
+
+def invalidate_user_pages(user_id):
+    """昵称、头像变化后作废所有展示该用户信息的缓存页"""
+    article_ids = {row[0] for row in db.session.query(Article.id).filter_by(user_id=user_id)}
+    article_ids |= {row[0] for row in db.session.query(Comment.article_id).filter_by(user_id=user_id).distinct()}
+    page_cache.invalidate(f'user:{user_id}', f'author:{user_id}', 'feed',
+                          *[f'article:{i}' for i in article_ids])
+
+
+def get_visible_article(article_id, *options):
+    """取文章；草稿只有作者本人能看到，其他人返回 None"""
+    article = Article.query.options(*options).get_or_404(article_id)
+    if article.is_draft and (not current_user.is_authenticated or current_user.id != article.user_id):
+        return None
+    return article
+
+
+def finish_import(user_id):
+    """导入之后刷新云图计数、相关文章和缓存页"""
+    if current_app.config['TERM_COUNTERS']:
+        job_queue.enqueue('term_counts.refresh', {'user_id': user_id}, key=f'term_counts:{user_id}', user_id=user_id)
+    article_ids = [row[0] for row in db.session.query(Article.id).filter_by(user_id=user_id, is_draft=False)]
+    if article_ids:
+        job_queue.enqueue('related.update', {'article_ids': article_ids}, key=f'related:user:{user_id}',
+                          user_id=user_id)
+    db.session.commit()
+    invalidate_user_pages(user_id)
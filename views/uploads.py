@@ -0,0 +1,61 @@
+"""图片上传和上传文件的访问"""
+from flask import Blueprint, request
+from flask_login import login_required, current_user
+
+from image_pipeline import validate_image, InvalidImage
+from models import db
+from storage import upload_store
+from views.common import save_upload, enqueue_upload_gc, invalidate_user_pages
+
+bp = Blueprint('uploads', __name__)
+
+
+# --- 1. 编辑器图片上传接口 ---
+@bp.route('/upload_article_img', methods=['POST'])
+@login_required
+def upload_article_img():
+    file = request.files.get('editormd-image-file')  # Editor.md 默认的文件名 key
+    if not file:
+        return {'success': 0, 'message': '未找到文件'}
+    try:
+        ext = validate_image(file)
+    except InvalidImage as e:
+        return {'success': 0, 'message': str(e)}
+
+    # 按内容哈希存储；文章保存时再根据正文登记引用关系
+    url = save_upload(file, 'article', ext)
+    db.session.commit()
+
+    # 返回 Editor.md 要求的格式
+    return {
+        'success': 1,
+        'message': '上传成功',
+        'url': url
+    }
+
+
+# --- 2. 个人头像上传接口 ---
+@bp.route('/upload_avatar', methods=['POST'])
+@login_required
+def upload_avatar():
+    file = request.files.get('avatar_file')
+    if file:
+        try:
+            ext = validate_image(file)
+        except InvalidImage as e:
+            return str(e), 400
+        url = save_upload(file, 'avatar', ext)
+
+        # 更新数据库，旧头像没人用了就清理掉
+        current_user.avatar_url = url
+        removed = upload_store.set_refs('user', current_user.id, upload_store.keys_in(url))
+        enqueue_upload_gc(removed)
+        db.session.commit()
+        invalidate_user_pages(current_user.id)
+    return "OK", 200
+
+
+# 上传文件的访问入口：文件名就是内容哈希，可以长期缓存
+@bp.route('/uploads/<path:key>')
+def serve_upload(key):
+    return upload_store.send(key)
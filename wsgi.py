@@ -0,0 +1,18 @@
+"""
+生产环境入口：
+
+    gunicorn --preload -w 4 wsgi:app
+
+--preload 让 gunicorn 在主进程里导入本模块、建好应用再 fork 出 worker：导入和初始化只做一次，
+已加载的代码和模板由所有 worker 写时复制共享。fork 之后每个 worker 会丢弃继承来的数据库连接，
+后台线程也是在各自的第一个请求时才启动。
+"""
+import gc
+
+from app import create_app, warm_up
+
+app = create_app()
+warm_up(app)
+# 把到目前为止创建的对象移出垃圾回收的跟踪范围：worker 里的 GC 不会再去改写这些对象所在的内存页，
+# 共享的内存不会因为写时复制被逐渐复制成每个 worker 私有的
+gc.freeze()